@@ -1,130 +1,230 @@
-class Node:
-    """A node class for A* Pathfinding"""
-
-    def __init__(self, parent=None, position=None):
-        self.parent = parent
-        self.position = position
-
-        self.g = 0
-        self.h = 0
-        self.f = 0
-
-    def __eq__(self, other):
-        return self.position == other.position
+import heapq
+from collections import deque
+from danger import DangerMap
+from buffers import SearchBuffers
+from npgrid import flat_cells
 
 
 def is_in_danger_zone(position, maze):
-    """Check if a position is within a radius of 2 of a bomb (value 2)"""
+    """Check if a position is within a radius of 2 of a bomb (value 2), without looking past walls"""
     x, y = position
-    directions = [[0,0], (1, 0), (-1, 0), (0, 1), (0, -1)]
+    if maze[y][x] == 2:
+        return True
 
-    for dx, dy in directions:
+    for dx, dy in [(1, 0), (-1, 0), (0, 1), (0, -1)]:
         for i in range(1, 3):  # Check up to 2 squares away
             nx, ny = x + dx * i, y + dy * i
-            if 0 <= nx < len(maze[0]) and 0 <= ny < len(maze):
-                if maze[ny][nx] == 2:  # Bomb detected
-                    return True
+            if not (0 <= nx < len(maze[0]) and 0 <= ny < len(maze)):
+                break
+            if maze[ny][nx] == 2:  # Bomb detected
+                return True
+            if maze[ny][nx] == 1:  # The wall shields this position
+                break
     return False
 
 
-def attack_astar(maze, start, end):
-    """Returns a list of tuples as a path from the given start to the given end in the given maze"""
-
-    # Create start and end node
-    start_node = Node(None, start)
-    start_node.g = start_node.h = start_node.f = 0
-    end_node = Node(None, end)
-    end_node.g = end_node.h = end_node.f = 0
-
-    # Initialize both open and closed list
-    open_list = []
-    closed_list = []
-
-    # Add the start node
-    open_list.append(start_node)
+def attack_astar(maze, start, end, danger=None, stats=None, max_expanded=None, buffers=None):
+    """Returns a list of tuples as a path from the given start to the given end in the given maze
+
+    danger is the game's DangerMap; without one it is built from the bombs on the maze.
+    If stats is a dict, the number of nodes expanded is stored in stats['expanded'].
+    The search gives up after max_expanded nodes, if given, and heads for the closest
+    node found so far, so an unreachable end can't make it search a whole big map.
+    buffers, a SearchBuffers as big as the maze, holds the search state; pass the
+    same one to every call to keep the search from allocating it each time.
+    """
+    if danger is None:
+        danger = DangerMap.from_grid(maze)
+    danger_counts = danger.counts
+
+    width = len(maze[0])
+    height = len(maze)
+    end_x, end_y = end
+    cells = flat_cells(maze)  # Flat view of a numpy grid, None for lists
+
+    # Cells are addressed as y*width+x; a cell's g and parent only count when it is
+    # stamped with this search's generation (reached) or the one after (expanded)
+    if buffers is None:
+        buffers = SearchBuffers(width * height)
+    reached = buffers.start()
+    closed = reached + 1
+    stamp, g_score, parent = buffers.stamp, buffers.distance, buffers.toward
+    start_index = start[1] * width + start[0]
+    end_index = end_y * width + end_x
+
+    # Open set entries are (f, order, index); the insertion order breaks ties the
+    # same way the old linear scan did (first inserted wins), and a cell's g and
+    # parent only change when a strictly cheaper way in is found
+    stamp[start_index] = reached
+    g_score[start_index] = 0
+    parent[start_index] = -1
+    open_heap = [(0, 0, start_index)]
+    order = 1
 
     # Track the closest node to the goal
-    closest_node = start_node
+    closest_index = start_index
     closest_distance = float("inf")
+    expanded = 0
 
     # Loop until you find the end or exhaust all possibilities
-    while len(open_list) > 0:
-
-        # Get the current node
-        current_node = open_list[0]
-        current_index = 0
-        for index, item in enumerate(open_list):
-            if item.f < current_node.f:
-                current_node = item
-                current_index = index
+    while open_heap:
 
-        # Pop current off open list, add to closed list
-        open_list.pop(current_index)
-        closed_list.append(current_node)
+        # Pop the lowest f, skipping stale duplicates of already expanded cells
+        current = heapq.heappop(open_heap)[2]
+        if stamp[current] == closed:
+            continue
+        stamp[current] = closed
+        expanded += 1
 
-        # Calculate the distance from the current node to the goal
-        current_distance = (current_node.position[0] - end_node.position[0]) ** 2 + (current_node.position[1] - end_node.position[1]) ** 2
+        y, x = divmod(current, width)
 
         # Update the closest node if this node is closer to the goal
+        current_distance = (x - end_x) ** 2 + (y - end_y) ** 2
         if current_distance < closest_distance:
-            closest_node = current_node
+            closest_index = current
             closest_distance = current_distance
 
         # Found the goal
-        if current_node == end_node:
-            path = []
-            current = current_node
-            while current is not None:
-                path.append(current.position)
-                current = current.parent
-            return path[::-1]  # Return reversed path
+        if current == end_index:
+            if stats is not None:
+                stats['expanded'] = expanded
+            return _build_path(parent, current, width)
 
         # Generate children (only horizontal and vertical moves)
-        children = []
-        for new_position in [(0, -1), (0, 1), (-1, 0), (1, 0)]:  # Adjacent squares without diagonals
-
-            # Get node position
-            node_position = (current_node.position[0] + new_position[0], current_node.position[1] + new_position[1])
+        child_g = g_score[current] + 1
+        for dx, dy in ((0, -1), (0, 1), (-1, 0), (1, 0)):
+            nx, ny = x + dx, y + dy
 
             # Make sure within range
-            if node_position[0] > (len(maze[0]) - 1) or node_position[0] < 0 or node_position[1] > (len(maze) - 1) or node_position[1] < 0:
+            if nx < 0 or nx >= width or ny < 0 or ny >= height:
+                continue
+
+            child = ny * width + nx
+            child_stamp = stamp[child]
+            if child_stamp == closed:
                 continue
 
             # Avoid bombs, fire, walls, and danger zones, but allow starting on the initial bomb
-            if node_position != start and maze[node_position[1]][node_position[0]] in (2, 1, 3) or is_in_danger_zone(node_position, maze):
+            cell = maze[ny][nx] if cells is None else cells[child]
+            if child != start_index and cell in (2, 1, 3) or danger_counts[child]:
                 continue
 
-            # Create new node
-            new_node = Node(current_node, node_position)
+            # A queued entry for this cell is already as cheap
+            if child_stamp == reached and g_score[child] <= child_g:
+                continue
+            stamp[child] = reached
+            g_score[child] = child_g
+            parent[child] = current
 
-            # Append
-            children.append(new_node)
+            h = (nx - end_x) ** 2 + (ny - end_y) ** 2
+            heapq.heappush(open_heap, (child_g + h, order, child))
+            order += 1
 
-        # Loop through children
-        for child in children:
+        if expanded == max_expanded:
+            break
 
-            # Child is on the closed list
-            if child in closed_list:
+    # If no path was found, return the path to the closest node
+    if stats is not None:
+        stats['expanded'] = expanded
+    return _build_path(parent, closest_index, width)
+
+
+def pursuit_field(maze, target, danger=None, stats=None, hunters=None, buffers=None):
+    """Runs one breadth-first search out of target over the cells attack_astar may enter
+
+    Returns the SearchBuffers it searched in (a new one unless buffers is given):
+    for each cell y*width+x reached, distance holds the number of steps to target
+    and toward the next cell on the way, -1 at target itself. Any number of NPCs
+    hunting the same target can then share one field instead of each running
+    attack_astar. hunters, if given, are the flat indices of the cells the NPCs
+    stand on: the search stops once all of them are reached, and reaches them even
+    on a bomb or in a blast, the way attack_astar may start there. If stats is a
+    dict, the number of cells expanded is stored in stats['expanded'].
+    """
+    if danger is None:
+        danger = DangerMap.from_grid(maze)
+    danger_counts = danger.counts
+    width = len(maze[0])
+    height = len(maze)
+    cells = flat_cells(maze)  # Flat view of a numpy grid, None for lists
+
+    if buffers is None:
+        buffers = SearchBuffers(width * height)
+    reached = buffers.start()
+    stamp, distance, toward = buffers.stamp, buffers.distance, buffers.toward
+
+    target_index = target[1] * width + target[0]
+    waiting = set(hunters) if hunters is not None else None
+    expanded = 0
+
+    # The target itself has to be enterable, like attack_astar's end
+    cell = maze[target[1]][target[0]] if cells is None else cells[target_index]
+    if cell in (2, 1, 3) or danger_counts[target_index]:
+        queue = deque()
+    else:
+        stamp[target_index] = reached
+        distance[target_index] = 0
+        toward[target_index] = -1
+        queue = deque([target_index])
+        if waiting is not None:
+            waiting.discard(target_index)
+
+    while queue and waiting != set():
+        current = queue.popleft()
+        expanded += 1
+        y, x = divmod(current, width)
+        next_distance = distance[current] + 1
+
+        for dx, dy in ((0, -1), (0, 1), (-1, 0), (1, 0)):
+            nx, ny = x + dx, y + dy
+            if nx < 0 or nx >= width or ny < 0 or ny >= height:
+                continue
+            neighbour = ny * width + nx
+            if stamp[neighbour] == reached:
                 continue
 
-            # Create the f, g, and h values
-            child.g = current_node.g + 1
-            child.h = ((child.position[0] - end_node.position[0]) ** 2) + ((child.position[1] - end_node.position[1]) ** 2)
-            child.f = child.g + child.h
-
-            # Child is already in the open list
-            if any(child == open_node and child.g > open_node.g for open_node in open_list):
+            cell = maze[ny][nx] if cells is None else cells[neighbour]
+            blocked = cell in (2, 1, 3) or danger_counts[neighbour]
+            if waiting is not None and neighbour in waiting:
+                # An NPC's cell: reached, whatever is on it, but not searched through if blocked
+                waiting.discard(neighbour)
+            elif blocked:
                 continue
 
-            # Add the child to the open list
-            open_list.append(child)
+            stamp[neighbour] = reached
+            distance[neighbour] = next_distance
+            toward[neighbour] = current
+            if not blocked:
+                queue.append(neighbour)
 
-    # If no path was found, return the path to the closest node
+    if stats is not None:
+        stats['expanded'] = expanded
+    return buffers
+
+
+def pursuit_path(field, start, width):
+    """Reads the path from start to the target out of a pursuit_field, or None if start wasn't reached"""
+    x, y = start
+    index = y * width + x
+    if index not in field:
+        return None
+
+    toward = field.toward
+    path = [start]
+    while toward[index] != -1:
+        index = toward[index]
+        y, x = divmod(index, width)
+        path.append((x, y))
+    return path
+
+
+def _build_path(parent, index, width):
+    """Walks the parent links back from index and returns the path as (x, y) tuples"""
     path = []
-    current = closest_node
-    while current is not None:
-        path.append(current.position)
-        current = current.parent
+    while index != -1:
+        y, x = divmod(index, width)
+        path.append((x, y))
+        index = parent[index]
     return path[::-1]  # Return reversed path
 
 
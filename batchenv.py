@@ -0,0 +1,156 @@
+import time
+import random
+import argparse
+from npgrid import np
+from game import Game, SimClock, SIZE, PERCENTAGE, FUSE, move_interval
+from replay import ReplayInputs
+
+# Action codes: 0 does nothing, then the player's keys
+ACTIONS = (None, "w", "s", "a", "d", "f")
+REWARDS = {'player': 1.0, 'enemy': -1.0, 'draw': 0.0}
+
+
+class BatchEnv:
+    """n independent games stepped together, one tick per step(), their grids in one array.
+
+    grids is a contiguous (n, size, size) int8 array whose slices are the games'
+    numpy grids, so it is the observation of the whole batch without any copying;
+    the next step overwrites it. The games share one SimClock. A step runs the
+    rules of only the games with something to do this tick: an action, an NPC due
+    to move (that isn't idle on an unchanged board), a bomb due to go off, fire
+    burning or the tick limit; for the rest,
+    which is most of them most ticks, it only counts the tick in the ticks array
+    (game.ticks catches up before the game's next real step). A round that ends
+    resets its game at once; the step it ended in returns its reward (1 if the
+    player won, -1 if it lost, 0 for a draw) and sets its done flag.
+    """
+
+    def __init__(self, n, size=SIZE, percentage=PERCENTAGE, seed=0, max_ticks=30 * 60, dt=1/30, **params):
+        if np is None:
+            raise RuntimeError("the batched environment needs numpy installed")
+        self.n = n
+        self.dt = dt
+        self.max_ticks = max_ticks
+        self.clock = SimClock()
+        self.grids = np.zeros((n, size, size), dtype=np.int8)
+        self.inputs = [ReplayInputs() for _ in range(n)]
+        self.games = [Game(size, percentage, seed=seed + i, clock=self.clock, max_ticks=max_ticks, backend="numpy",
+                           inputs=self.inputs[i], board=self.grids[i], **params) for i in range(n)]
+
+        self.ticks = np.zeros(n, dtype=np.int64)
+        self.rewards = np.zeros(n, dtype=np.float32)
+        self.dones = np.zeros(n, dtype=bool)
+
+        # What each game waits for, refreshed after each of its real steps: the
+        # earliest last move of its NPCs, the timestamp of its next fuse and
+        # whether fire is burning
+        self.moved = np.full(n, np.inf)
+        self.fuses = np.full(n, np.inf)
+        self.burning = np.zeros(n, dtype=bool)
+        for i in range(n):
+            self.refresh(i)
+
+        self.steps = 0
+        self.game_steps = 0  # Games whose rules ran, over all steps
+
+    def refresh(self, i):
+        game = self.games[i]
+        targets = [(npc, game.player.pos) for npc in game.npcs]
+        if game.ai_player:
+            targets.append((game.player, game.enemy.pos))
+        # An NPC that found nothing to do finds nothing again until its idle key
+        # changes, which takes a real step of its game, so only the others wake it
+        self.moved[i] = min((npc.last_move_time for npc, target in targets
+                             if npc.next_moves or npc.idle is None or npc.idle != npc.idle_key(target)),
+                            default=np.inf)
+        fuses = game.circles.fuses
+        self.fuses[i] = fuses[0][0] if fuses else np.inf  # Possibly stale, which only wakes the game early
+        self.burning[i] = len(game.fire) > 0
+
+    def reset(self):
+        """Starts a new round in every game and returns the grids"""
+        for i, game in enumerate(self.games):
+            game.reset()
+            self.refresh(i)
+        self.ticks[:] = 0
+        return self.grids
+
+    def due(self, actions):
+        """Mask of the games whose rules have something to do this tick
+
+        The comparisons are the ones Game.step makes, on the same floats, so a
+        game left out would have done nothing.
+        """
+        now = self.clock()
+        due = (actions != 0) | self.burning
+        due |= now - self.moved > move_interval
+        due |= self.fuses < now - FUSE
+        if self.max_ticks is not None:
+            due |= self.ticks >= self.max_ticks
+        return due
+
+    def step(self, actions):
+        """Applies one action per game and advances every game a tick; returns (grids, rewards, dones)"""
+        actions = np.asarray(actions)
+        self.clock.advance(self.dt)
+        self.ticks += 1
+        self.rewards[:] = 0.0
+        self.dones[:] = False
+
+        due = np.flatnonzero(self.due(actions)).tolist()
+        for i in due:
+            game = self.games[i]
+            action = actions[i]
+            if action:
+                self.inputs[i].pending = [(0, ACTIONS[action], 0.0)]
+            game.ticks = int(self.ticks[i]) - 1
+            winner = game.step()
+            self.ticks[i] = game.ticks
+            if winner is not None:
+                self.rewards[i] = REWARDS[winner]
+                self.dones[i] = True
+            self.refresh(i)
+
+        self.steps += 1
+        self.game_steps += len(due)
+        return self.grids, self.rewards, self.dones
+
+
+def random_actions(rng, n, rate):
+    """A batch of actions where each game presses a random key with probability rate"""
+    pressed = rng.random(n) < rate
+    return np.where(pressed, rng.integers(1, len(ACTIONS), n), 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Game ticks per second of a batch of games against stepping them one by one")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100, 1000], help="batch sizes")
+    parser.add_argument("--steps", type=int, default=300)
+    parser.add_argument("--rate", type=float, default=0.1, help="chance a game presses a key each tick")
+    args = parser.parse_args()
+
+    for n in args.sizes:
+        rng = np.random.default_rng(0)
+        env = BatchEnv(n)
+        started = time.perf_counter()
+        for _ in range(args.steps):
+            env.step(random_actions(rng, n, args.rate))
+        batched = n * args.steps / (time.perf_counter() - started)
+
+        # The same games, each stepped every tick
+        py_rng = random.Random(0)
+        games = [Game(SIZE, PERCENTAGE, seed=i, max_ticks=30 * 60, backend="numpy", inputs=ReplayInputs()) for i in range(n)]
+        started = time.perf_counter()
+        for _ in range(args.steps):
+            for game in games:
+                if py_rng.random() < args.rate:
+                    game.inputs.pending = [(0, py_rng.choice(ACTIONS[1:]), 0.0)]
+                game.step(1/30)
+        single = n * args.steps / (time.perf_counter() - started)
+
+        print(f"n={n:>5}: {batched:>9.0f} game ticks/s batched ({env.game_steps / (n * args.steps):.0%} ran the rules), "
+              f"{single:>9.0f} one by one, x{batched / single:.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,421 @@
+import sys
+import time
+import random
+import tracemalloc
+from attack import attack_astar, is_in_danger_zone
+from defend import defend_astar, escape_field, escape_path, simulate_explosions
+from danger import DangerMap
+from planner import AttackPlanner
+import npgrid
+import game
+
+
+class Node:
+    """A node class for the original list-based A*, kept as the benchmark reference"""
+
+    def __init__(self, parent=None, position=None):
+        self.parent = parent
+        self.position = position
+
+        self.g = 0
+        self.h = 0
+        self.f = 0
+
+    def __eq__(self, other):
+        return self.position == other.position
+
+
+def reference_attack_astar(maze, start, end):
+    """The original attack_astar with linear open/closed lists, used to measure the speedup"""
+    start_node = Node(None, start)
+    end_node = Node(None, end)
+    open_list = [start_node]
+    closed_list = []
+    closest_node = start_node
+    closest_distance = float("inf")
+
+    while len(open_list) > 0:
+        current_node = open_list[0]
+        current_index = 0
+        for index, item in enumerate(open_list):
+            if item.f < current_node.f:
+                current_node = item
+                current_index = index
+
+        open_list.pop(current_index)
+        closed_list.append(current_node)
+
+        current_distance = (current_node.position[0] - end_node.position[0]) ** 2 + (current_node.position[1] - end_node.position[1]) ** 2
+        if current_distance < closest_distance:
+            closest_node = current_node
+            closest_distance = current_distance
+
+        if current_node == end_node:
+            closest_node = current_node
+            break
+
+        children = []
+        for new_position in [(0, -1), (0, 1), (-1, 0), (1, 0)]:
+            node_position = (current_node.position[0] + new_position[0], current_node.position[1] + new_position[1])
+            if node_position[0] > (len(maze[0]) - 1) or node_position[0] < 0 or node_position[1] > (len(maze) - 1) or node_position[1] < 0:
+                continue
+            if node_position != start and maze[node_position[1]][node_position[0]] in (2, 1, 3) or is_in_danger_zone(node_position, maze):
+                continue
+            children.append(Node(current_node, node_position))
+
+        for child in children:
+            if child in closed_list:
+                continue
+            child.g = current_node.g + 1
+            child.h = ((child.position[0] - end_node.position[0]) ** 2) + ((child.position[1] - end_node.position[1]) ** 2)
+            child.f = child.g + child.h
+            if any(child == open_node and child.g > open_node.g for open_node in open_list):
+                continue
+            open_list.append(child)
+
+    path = []
+    current = closest_node
+    while current is not None:
+        path.append(current.position)
+        current = current.parent
+    return path[::-1]
+
+
+def make_maze(size, percentage, seed):
+    """Random walls like Map, with both corners kept free for the search endpoints"""
+    rng = random.Random(seed)
+    maze = [[1 if rng.random() * 100 < percentage else 0 for _ in range(size)] for _ in range(size)]
+    maze[0][0] = -1
+    maze[size-1][size-1] = -2
+    return maze
+
+
+def timed(func, *args, repeat=3):
+    """Best wall-clock time of func(*args) over repeat runs, together with its result"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def bench_attack(sizes=(10, 25, 50, 100, 250, 500), percentage=30, reference_max=100):
+    print(f"attack_astar, {percentage}% walls, corner to corner")
+    print(f"{'size':>6} {'heap (ms)':>12} {'reference (ms)':>16} {'speedup':>9}")
+    for size in sizes:
+        maze = make_maze(size, percentage, seed=size)
+        start, end = (size-1, size-1), (0, 0)
+        new_time, new_path = timed(attack_astar, maze, start, end)
+
+        if size <= reference_max:
+            old_time, old_path = timed(reference_attack_astar, maze, start, end, repeat=1)
+            assert old_path == new_path, f"paths differ on {size}x{size}"
+            print(f"{size:>6} {new_time * 1000:>12.2f} {old_time * 1000:>16.2f} {old_time / new_time:>8.1f}x")
+        else:
+            print(f"{size:>6} {new_time * 1000:>12.2f} {'-':>16} {'-':>9}")
+
+
+def reference_defend_astar(maze, start, danger=None):
+    """The original defend_astar with linear open/closed lists, used to measure the speedup"""
+    if danger is None:
+        danger = DangerMap.from_grid(maze)
+    danger_counts = danger.counts
+    width = len(maze[0])
+    cells = npgrid.flat_cells(maze)  # Flat view of a numpy grid, None for lists
+
+    # Create start node
+    start_node = Node(None, start)
+    start_node.g = start_node.h = start_node.f = 0
+
+    # Initialize both open and closed list
+    open_list = []
+    closed_list = []
+
+    # Add the start node
+    open_list.append(start_node)
+
+    # Track the closest safe spot
+    closest_safe_spot = None
+
+    # Loop until you find a safe spot or exhaust all possibilities
+    while len(open_list) > 0:
+        # Get the current node
+        current_node = open_list[0]
+        current_index = 0
+        for index, item in enumerate(open_list):
+            if item.f < current_node.f:
+                current_node = item
+                current_index = index
+
+        # Pop current off open list, add to closed list
+        open_list.pop(current_index)
+        closed_list.append(current_node)
+
+        # Check if we've reached a safe spot
+        x, y = current_node.position
+        cell = maze[y][x] if cells is None else cells[y * width + x]
+        if (cell == 0 or cell == -1) and not danger_counts[y * width + x]:
+            path = []
+            current = current_node
+            while current is not None:
+                path.append(current.position)
+                current = current.parent
+            return path[::-1]  # Return reversed path
+
+        # Generate children (only horizontal and vertical moves)
+        children = []
+        for new_position in [(1, 0), (-1, 0), (0, 1), (0, -1)]:  # Adjacent squares without diagonals
+
+            # Get node position
+            node_position = (x + new_position[0], y + new_position[1])
+
+            # Make sure within range
+            if node_position[0] > (len(maze[0]) - 1) or node_position[0] < 0 or node_position[1] > (len(maze) - 1) or node_position[1] < 0:
+                continue
+
+            # Skip impassable terrain: walls (1)
+            index = node_position[1] * width + node_position[0]
+            cell = maze[node_position[1]][node_position[0]] if cells is None else cells[index]
+            if cell == 1:
+                continue
+
+            # Create new node with a higher cost for moving into fire
+            new_node = Node(current_node, node_position)
+            on_fire = cell == 3 or danger_counts[index]
+            new_node.g = current_node.g + (2 if on_fire else 1)  # Higher cost for fire
+            new_node.h = ((new_node.position[0] - start[0]) ** 2) + ((new_node.position[1] - start[1]) ** 2)
+            new_node.f = new_node.g + new_node.h
+
+            # Skip nodes already in the closed list
+            if new_node in closed_list:
+                continue
+
+            # Skip nodes already in the open list with a lower g value
+            if any(child == new_node and new_node.g > child.g for child in open_list):
+                continue
+
+            # Add the new node to the open list
+            open_list.append(new_node)
+    
+
+    # If no path was found, return None
+    return None
+
+
+def bench_defend(sizes=(10, 25, 50, 100), percentage=30, reference_max=50):
+    """defend_astar out of the middle of a map covered in bombs, against the original list-based search"""
+    print(f"defend_astar, {percentage}% walls, a bomb on every other open cell, from the middle")
+    print(f"{'size':>6} {'heap (ms)':>12} {'reference (ms)':>16} {'speedup':>9}")
+    for size in sizes:
+        maze = make_maze(size, percentage, seed=size)
+        open_cells = [(x, y) for y in range(size) for x in range(size) if maze[y][x] == 0]
+        for x, y in random.Random(size).sample(open_cells, len(open_cells) // 2):
+            maze[y][x] = 2
+        start = min(open_cells, key=lambda cell: abs(cell[0] - size // 2) + abs(cell[1] - size // 2))
+        danger = DangerMap.from_grid(maze)
+        new_time, new_path = timed(defend_astar, maze, start, danger)
+
+        if size <= reference_max:
+            old_time, old_path = timed(reference_defend_astar, maze, start, danger, repeat=1)
+            assert old_path == new_path, f"paths differ on {size}x{size}"
+            print(f"{size:>6} {new_time * 1000:>12.2f} {old_time * 1000:>16.2f} {old_time / new_time:>8.1f}x")
+        else:
+            print(f"{size:>6} {new_time * 1000:>12.2f} {'-':>16} {'-':>9}")
+
+
+def plan_with_defend_astar(maze, starts):
+    return [defend_astar(maze, start) for start in starts]
+
+
+def plan_with_escape_field(maze, starts):
+    field = escape_field(maze)
+    return [escape_path(field, start, len(maze[0])) for start in starts]
+
+
+def bench_escape(size=40, percentage=30, npc_counts=(1, 10, 50, 200)):
+    """Planning cost of N NPCs fleeing the same bombs: one defend_astar each vs one shared escape_field"""
+    maze = make_maze(size, percentage, seed=size)
+    rng = random.Random(size)
+    open_cells = [(x, y) for y in range(size) for x in range(size) if maze[y][x] == 0]
+    for x, y in rng.sample(open_cells, size // 2):
+        maze[y][x] = 2
+    open_cells = [(x, y) for x, y in open_cells if maze[y][x] == 0]
+
+    print(f"defend planning on {size}x{size} with {size // 2} bombs")
+    print(f"{'npcs':>6} {'defend_astar (ms)':>18} {'escape_field (ms)':>18}")
+    for count in npc_counts:
+        starts = rng.sample(open_cells, min(count, len(open_cells)))
+        astar_time, _ = timed(plan_with_defend_astar, maze, starts, repeat=1)
+        field_time, _ = timed(plan_with_escape_field, maze, starts)
+        print(f"{count:>6} {astar_time * 1000:>18.2f} {field_time * 1000:>18.2f}")
+
+
+def chase(maze, steps, seed, planner=None):
+    """An NPC walking its attack path toward a target that wanders one cell per step
+
+    Replans every step, from scratch with attack_astar or by repairing planner's
+    search; returns the nodes expanded per replan.
+    """
+    size = len(maze)
+    danger = DangerMap.from_grid(maze)
+    rng = random.Random(seed)
+    npc, target = (size-1, size-1), (0, 0)
+    stats = {}
+    expanded = []
+    for _ in range(steps):
+        if planner is not None:
+            path = planner.plan(npc, target, stats)
+        else:
+            path = attack_astar(maze, npc, target, danger, stats)
+        expanded.append(stats['expanded'])
+        if path and len(path) > 2:
+            npc = path[1]
+        x, y = target
+        moves = [(x + dx, y + dy) for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1))
+                 if 0 <= x + dx < size and 0 <= y + dy < size and maze[y + dy][x + dx] != 1]
+        if moves:
+            target = rng.choice(moves)
+    return expanded
+
+
+def bench_replan(sizes=(25, 50, 100, 250), percentage=30, steps=200):
+    """Per-step replanning while chasing a moving target: attack_astar from scratch vs AttackPlanner"""
+    print(f"attack replanning, {percentage}% walls, {steps} steps of a chase")
+    print("(per step: mean time, mean and median nodes expanded; the planner's first search is a full one)")
+    print(f"{'size':>6} {'astar (ms)':>11} {'nodes':>7} {'p50':>5} {'planner (ms)':>13} {'nodes':>7} {'p50':>5}")
+    for size in sizes:
+        maze = make_maze(size, percentage, seed=size)
+        astar_time, astar_nodes = timed(chase, maze, steps, size, repeat=1)
+        planner_time, planner_nodes = timed(lambda maze=maze, size=size: chase(maze, steps, size, AttackPlanner(maze, DangerMap.from_grid(maze))), repeat=1)
+        print(f"{size:>6} {astar_time / steps * 1000:>11.3f} {sum(astar_nodes) / steps:>7.0f} {sorted(astar_nodes)[steps // 2]:>5} "
+              f"{planner_time / steps * 1000:>13.3f} {sum(planner_nodes) / steps:>7.0f} {sorted(planner_nodes)[steps // 2]:>5}")
+
+
+def crowd_planning_time(npc_count, size, percentage, ticks, seed):
+    """Mean NPC planning time per tick of a crowd game with a randomly walking player"""
+    rounds = []
+    crowd = game.Game(size=size, percentage=percentage, seed=seed, npc_count=npc_count,
+                      on_game_over=lambda winner, message: rounds.append(crowd.planning_time))
+    rng = random.Random(seed)
+    for tick in range(ticks):
+        if tick % 4 == 0:
+            crowd.player.move_player(rng.choice('wasd'), crowd.level_map.grid, crowd.enemy.pos)
+        crowd.step(1/30)
+    return (sum(rounds) + crowd.planning_time) / ticks
+
+
+def bench_crowd(npc_counts=(1, 10, 50, 200), size=60, percentage=30, ticks=300):
+    """NPC planning time per tick as the crowd grows: one shared pursuit field vs a planner per NPC"""
+    print(f"crowd planning on {size}x{size}, {percentage}% walls, {ticks} ticks")
+    print(f"{'npcs':>6} {'field (ms/tick)':>16} {'planners (ms/tick)':>19}")
+    for count in npc_counts:
+        field_time = crowd_planning_time(count, size, percentage, ticks, seed=count)
+        game.PURSUIT_FIELD = False
+        try:
+            planner_time = crowd_planning_time(count, size, percentage, ticks, seed=count)
+        finally:
+            game.PURSUIT_FIELD = True
+        print(f"{count:>6} {field_time * 1000:>16.3f} {planner_time * 1000:>19.3f}")
+
+
+def bench_simulate_explosions(sizes=(100, 500, 1000), percentage=30, bombs_per_row=2):
+    """simulate_explosions on list grids vs the vectorized numpy version"""
+    if npgrid.np is None:
+        print("simulate_explosions: numpy not installed, skipping")
+        return
+
+    print(f"simulate_explosions, {bombs_per_row} bombs per row")
+    print(f"{'size':>6} {'list (ms)':>12} {'numpy (ms)':>12}")
+    for size in sizes:
+        maze = make_maze(size, percentage, seed=size)
+        rng = random.Random(size)
+        for y in range(size):
+            for x in rng.sample(range(size), bombs_per_row):
+                maze[y][x] = 2
+        array = npgrid.to_array(maze)
+
+        list_time, _ = timed(simulate_explosions, maze, repeat=1)
+        array_time, _ = timed(npgrid.simulate_explosions, array)
+        print(f"{size:>6} {list_time * 1000:>12.2f} {array_time * 1000:>12.2f}")
+
+
+def tick_allocations(ticks, warmup, seed=0, walk=False, **params):
+    """Mean and p99 bytes allocated within a tick, over what was allocated when it started
+
+    tracemalloc's peak is reset before each tick, so this is the tick's transient
+    memory: search state, paths, heap entries and the objects they hold.
+    """
+    sim = game.Game(seed=seed, **params)
+    rng = random.Random(seed)
+
+    def step(tick):
+        if walk and tick % 4 == 0:
+            sim.player.move_player(rng.choice('wasd'), sim.level_map.grid, sim.enemy.pos)
+        sim.step(1/30)
+
+    for tick in range(warmup):
+        step(tick)
+    tracemalloc.start()
+    peaks = []
+    try:
+        for tick in range(ticks):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            step(tick)
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+    peaks.sort()
+    return sum(peaks) / ticks, peaks[int(ticks * 0.99)]
+
+
+def bytes_per_object(make, count=1000):
+    """Memory kept per object made by make(i), as tracemalloc sees it"""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        objects = [make(i) for i in range(count)]
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return (after - before - sys.getsizeof(objects)) / len(objects)
+
+
+def bench_allocations(ticks=600, warmup=300):
+    """Transient memory per tick of a few kinds of games, and the memory of the objects created the most"""
+    print(f"allocations per tick (tracemalloc peak over the tick's start, {ticks} ticks)")
+    print(f"{'game':>28} {'mean (B)':>10} {'p99 (B)':>10}")
+    scenarios = [
+        ("10x10 NPC vs NPC", dict(ai_player=True)),
+        ("200x200 NPC vs NPC, budget", dict(ai_player=True, size=200, percentage=40, search_budget=1000)),
+        ("60x60 crowd of 50", dict(size=60, percentage=30, npc_count=50, walk=True)),
+    ]
+    for label, params in scenarios:
+        mean, p99 = tick_allocations(ticks, warmup, **params)
+        print(f"{label:>28} {mean:>10.0f} {p99:>10.0f}")
+
+    crowd = game.Game(size=20, percentage=0, seed=0, npc_count=2)
+    print(f"bytes per object: Enemy {bytes_per_object(lambda i: game.Enemy(crowd, pos=(1, 1))):.0f}, "
+          f"Circle {bytes_per_object(lambda i: game.Circle((i % 20, i // 20), crowd.player, 0.0)):.0f}")
+
+
+def main():
+    reference_max = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    bench_attack(reference_max=reference_max)
+    print()
+    bench_defend()
+    print()
+    bench_escape()
+    print()
+    bench_replan()
+    print()
+    bench_crowd()
+    print()
+    bench_simulate_explosions()
+    print()
+    bench_allocations()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,365 @@
+import io
+import sys
+import json
+import time
+import random
+import timeit
+import argparse
+import platform
+import npgrid
+import game
+from attack import attack_astar
+from defend import defend_astar, simulate_explosions
+from danger import DangerMap
+from buffers import SearchBuffers
+from render import Renderer, Camera
+from profiler import Profiler
+from benchmark import make_maze
+
+BASELINE = "benchmarks.json"
+THRESHOLD = 0.25       # A scenario doing this much more work than its baseline fails; work counts are exact
+TIME_THRESHOLD = 1.0   # Or one taking this much longer; timings vary by up to ~40% from run to run
+REPEAT = 15       # Timings per scenario; the fastest one counts
+MIN_TIME = 0.01   # Seconds each timing of a repeatable scenario runs for at least
+RETRIES = 2       # Extra measurements of a scenario that looks slower, before it fails
+
+
+class Scenario:
+    """One timed case of the suite.
+
+    setup() builds the inputs and returns the function to time. A repeatable
+    scenario's function is called many times per timing; otherwise setup() runs
+    again (untimed) before each call, for cases that use up their inputs, like
+    bombs going off. Each call does per_call units of work and the result is the
+    time per unit. work, if given, runs the scenario once on fresh inputs and
+    returns a count of what it did (nodes expanded, bytes written), which unlike
+    the time is exact from one run to the next.
+    """
+
+    def __init__(self, name, setup, repeatable=True, per_call=1, work=None):
+        self.name = name
+        self.setup = setup
+        self.repeatable = repeatable
+        self.per_call = per_call
+        self.work = work
+
+    def measure(self, repeat=REPEAT):
+        """Best seconds per unit of work over repeat timings"""
+        if self.repeatable:
+            timer = timeit.Timer(self.setup())
+            number = 1
+            while timer.timeit(number) < MIN_TIME:
+                number *= 2
+            best = min(timer.repeat(repeat, number)) / number
+        else:
+            best = float("inf")
+            for _ in range(repeat):
+                run = self.setup()
+                started = time.perf_counter()
+                run()
+                best = min(best, time.perf_counter() - started)
+        return best / self.per_call
+
+
+def add_bombs(maze, count, seed):
+    """Puts count bombs on random empty cells of maze, out of blast range of the corners"""
+    rng = random.Random(seed)
+    size = len(maze)
+    empty = [(x, y) for y in range(size) for x in range(size) if maze[y][x] == 0 and 4 < x + y < 2 * size - 6]
+    for x, y in rng.sample(empty, min(count, len(empty))):
+        maze[y][x] = 2
+    return maze
+
+
+def attack_scenario(size, walls, bombs):
+    def setup(stats=None):
+        maze = add_bombs(make_maze(size, walls, seed=size), bombs, seed=size)
+        danger = DangerMap.from_grid(maze)
+        buffers = SearchBuffers(size * size)
+        return lambda: attack_astar(maze, (size - 1, size - 1), (0, 0), danger, stats, None, buffers)
+
+    def work():
+        stats = {}
+        setup(stats)()
+        return stats['expanded']
+    return Scenario(f"attack_astar size={size} walls={walls} bombs={bombs}", setup, work=work)
+
+
+def defend_scenario(size, walls, bombs):
+    def setup(stats=None):
+        maze = add_bombs(make_maze(size, walls, seed=size), bombs, seed=size)
+        # Start on a bomb in the middle of the map, so there is something to escape
+        start = min((abs(x - size // 2) + abs(y - size // 2), (x, y))
+                    for y, row in enumerate(maze) for x, cell in enumerate(row) if cell == 2)[1]
+        danger = DangerMap.from_grid(maze)
+        buffers = SearchBuffers(size * size)
+        return lambda: defend_astar(maze, start, danger, stats, buffers)
+
+    def work():
+        stats = {}
+        setup(stats)()
+        return stats['expanded']
+    return Scenario(f"defend_astar size={size} walls={walls} bombs={bombs}", setup, work=work)
+
+
+def explosions_scenario(size, walls, bombs, backend):
+    def setup():
+        maze = add_bombs(make_maze(size, walls, seed=size), bombs, seed=size)
+        if backend == "numpy":
+            maze = npgrid.to_array(maze)
+        return lambda: simulate_explosions(maze)
+    return Scenario(f"simulate_explosions size={size} walls={walls} bombs={bombs} {backend}", setup)
+
+
+def chain_scenario(size, bombs):
+    """Bombs on every other cell of every other row, cleared around: the first sets off all the others"""
+    def setup():
+        sim = game.Game(size=size, percentage=30, seed=size)
+        sim.clock.advance(10)  # Triggered bombs are due from 3s after time 0
+        level_map = sim.level_map
+        columns = (size + 1) // 2
+        rows = -(-bombs // columns)
+        for y in range(min(2 * rows, size)):
+            for x in range(size):
+                level_map.set(x, y, 0)
+        for i in range(bombs):
+            x, y = 2 * (i % columns), 2 * (i // columns)
+            circle = game.Circle((x, y), sim.player, sim.clock() - 10 if i == 0 else sim.clock())
+            sim.circles.add(circle)
+            level_map.set(x, y, game.CIRCLE)
+            level_map.add_bomb((x, y))
+        return lambda: game.Circle.detonate_circles(sim)
+    return Scenario(f"create_explosion chain size={size} bombs={bombs}", setup, repeatable=False, per_call=bombs)
+
+
+def enemy_scenario(size, walls, search_budget=None):
+    """An NPC on a fresh map taking 4*size steps after a randomly walking player, planning as it goes"""
+    moves = 4 * size
+
+    def setup(profiler=None):
+        sim = game.Game(size=size, percentage=walls, seed=size, search_budget=search_budget, profiler=profiler)
+        npc, player, grid = sim.enemy, sim.player, sim.level_map.grid
+        rng = random.Random(size)
+
+        def run():
+            for _ in range(moves):
+                player.move_player(rng.choice("wasd"), grid, npc.pos)
+                sim.clock.advance(game.move_interval + 0.01)
+                npc.move(grid, player.pos)
+        return run
+
+    def work():
+        # Every search counts the nodes it expanded under '<search>.nodes'
+        profiler = Profiler()
+        setup(profiler)()
+        return int(sum(histogram.total for histogram in profiler.counts.values()))
+    budget = f" budget={search_budget}" if search_budget is not None else ""
+    return Scenario(f"Enemy.move size={size} walls={walls}{budget}", setup, repeatable=False, per_call=moves, work=work)
+
+
+def draw_scenario(size, walls, changes, view=None):
+    """Map.draw after changes cells flipped since the last frame; changes=None redraws everything"""
+    def setup(renderer=None):
+        sim = game.Game(size=size, percentage=walls, seed=size)
+        level_map, grid = sim.level_map, sim.level_map.grid
+        renderer = renderer or Renderer(io.StringIO())
+        window = Camera(*view).follow((size // 2, size // 2), size, size) if view is not None else None
+        left, top, width, height = window if window is not None else (0, 0, size, size)
+        cells = [(left + i % width, top + i // width) for i in random.Random(size).sample(range(width * height), changes or 0)]
+        level_map.draw(renderer, "", (), window)
+
+        def run():
+            if changes is None:
+                renderer.invalidate()
+            for x, y in cells:
+                grid[y][x] = game.FIRE if grid[y][x] != game.FIRE else 0
+            renderer.out.seek(0)
+            renderer.out.truncate()
+            level_map.draw(renderer, "", (), window)
+        return run
+
+    def work():
+        renderer = Renderer(io.StringIO())
+        setup(renderer)()
+        return renderer.bytes_written
+    kind = "full" if changes is None else f"changes={changes}"
+    shown = f" view={view[0]}x{view[1]}" if view is not None else ""
+    return Scenario(f"Map.draw size={size} walls={walls} {kind}{shown}", setup, work=work)
+
+
+def calibration():
+    """A fixed piece of plain Python, timed to tell how fast the machine is running right now"""
+    def setup():
+        def run():
+            table = {}
+            for i in range(20000):
+                table[i % 1000] = table.get(i % 1000, 0) + i
+            return sorted(table.values())
+        return run
+    return Scenario("calibration", setup)
+
+
+def scenarios(quick=False):
+    suite = []
+    for size in (25, 100) if quick else (25, 100, 250):
+        for walls in (10, 30):
+            for bombs in (0, size // 2):
+                suite.append(attack_scenario(size, walls, bombs))
+    for size in (10, 25) if quick else (10, 25, 40):
+        for walls in (10, 30):
+            for bombs in (2, size // 2):
+                suite.append(defend_scenario(size, walls, bombs))
+    backends = ("list", "numpy") if npgrid.np is not None else ("list",)
+    for size in (50, 200) if quick else (50, 200, 500):
+        for walls in (10, 30):
+            for bombs in (size // 10, size * 2):
+                for backend in backends:
+                    suite.append(explosions_scenario(size, walls, bombs, backend))
+    for size, bombs in ((10, 4), (25, 40), (51, 200)) if quick else ((10, 4), (25, 40), (51, 200), (101, 1000)):
+        suite.append(chain_scenario(size, bombs))
+    for size in (10, 50) if quick else (10, 50, 200):
+        for walls in (10, 40):
+            suite.append(enemy_scenario(size, walls, search_budget=1000 if size >= 200 else None))
+    for size in (10, 30):
+        for walls in (10, 40):
+            suite.append(draw_scenario(size, walls, None))
+            suite.append(draw_scenario(size, walls, size))
+    for size in (500,) if quick else (500, 2000):
+        suite.append(draw_scenario(size, 40, None, view=(60, 30)))
+        suite.append(draw_scenario(size, 40, 20, view=(60, 30)))
+    return suite
+
+
+def measure_units(scenario, reference, repeat):
+    """Seconds per unit of scenario, divided by the seconds of the reference (calibration) code
+
+    The reference runs right before and after the scenario and the faster of the
+    two counts. That takes out most of the difference between machines, and
+    between a quiet and a busy moment on the same machine. Returns (units, seconds).
+    """
+    before = reference.measure(repeat)
+    seconds = scenario.measure(repeat)
+    unit = min(before, reference.measure(repeat))
+    return seconds / unit, seconds
+
+
+def run(suite, repeat=REPEAT, out=sys.stdout):
+    """Times every scenario and counts its work; returns the results as stored in a baseline file"""
+    reference = calibration()
+    units, work = {}, {}
+    for scenario in suite:
+        units[scenario.name], seconds = measure_units(scenario, reference, repeat)
+        if scenario.work is not None:
+            work[scenario.name] = scenario.work()
+        out.write(f"  {scenario.name:<62} {seconds * 1e6:>12.1f} us {units[scenario.name]:>10.4f}\n")
+        out.flush()
+    return {
+        'python': platform.python_version(),
+        'numpy': npgrid.np is not None,
+        'calibration': reference.measure(repeat),  # Seconds, for reference
+        'scenarios': units,
+        'work': work,
+    }
+
+
+def regressed(results, baseline, threshold):
+    """Names of the scenarios slower than their baseline by more than threshold"""
+    return [name for name, units in results['scenarios'].items()
+            if name in baseline['scenarios'] and units / baseline['scenarios'][name] - 1 > threshold]
+
+
+def confirm(suite, results, baseline, threshold, repeat=REPEAT, retries=RETRIES):
+    """Measures the scenarios that look slower again, keeping their best result
+
+    Any one timing can land on a busy moment of the machine; a real regression
+    is slow every time.
+    """
+    reference = calibration()
+    by_name = {scenario.name: scenario for scenario in suite}
+    for _ in range(retries):
+        names = regressed(results, baseline, threshold)
+        if not names:
+            break
+        print(f"measuring {len(names)} slower scenario(s) again")
+        for name in names:
+            units, _ = measure_units(by_name[name], reference, repeat)
+            results['scenarios'][name] = min(results['scenarios'][name], units)
+
+
+def compare(results, baseline, threshold=THRESHOLD, time_threshold=TIME_THRESHOLD):
+    """Prints each scenario against its baseline and returns the names of the ones that regressed
+
+    A scenario regresses when its work count grew by more than threshold, or when
+    it takes more than time_threshold longer: timings are too noisy to gate on
+    closely, so they mostly inform, and catch only gross slowdowns.
+    """
+    print(f"calibration {results['calibration'] * 1e6:.0f} us now, {baseline['calibration'] * 1e6:.0f} us for the baseline")
+    print(f"{'scenario (time in calibration units)':<64} {'baseline':>10} {'now':>10} {'change':>8} {'work':>12}")
+    slower = set(regressed(results, baseline, time_threshold))
+    old_work = baseline.get('work', {})
+    regressions = []
+    for name, units in results['scenarios'].items():
+        old = baseline['scenarios'].get(name)
+        work = results['work'].get(name)
+        work_text = "" if work is None else str(work)
+        if name in old_work and work is not None and work != old_work[name]:
+            work_text = f"{old_work[name]}->{work}"
+        if old is None:
+            print(f"{name:<64} {'-':>10} {units:>10.4f} {'new':>8} {work_text:>12}")
+            continue
+        more_work = name in old_work and work is not None and work > old_work[name] * (1 + threshold)
+        flag = ""
+        if name in slower or more_work:
+            regressions.append(name)
+            flag = "  REGRESSED" + (" (work)" if more_work else "")
+        print(f"{name:<64} {old:>10.4f} {units:>10.4f} {units / old - 1:>+8.0%} {work_text:>12}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Timed scenarios for the searches, explosions and drawing, checked against a baseline")
+    parser.add_argument("--baseline", default=BASELINE, help="baseline JSON file")
+    parser.add_argument("--save", action="store_true", help="write the results as the new baseline instead of comparing")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="fraction more work than the baseline that fails a scenario")
+    parser.add_argument("--time-threshold", type=float, default=TIME_THRESHOLD, help="fraction slower than the baseline that fails a scenario")
+    parser.add_argument("--filter", default="", help="only run the scenarios whose name contains this")
+    parser.add_argument("--quick", action="store_true", help="smaller sizes, for a fast check")
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    args = parser.parse_args()
+
+    suite = [scenario for scenario in scenarios(args.quick) if args.filter in scenario.name]
+    print(f"running {len(suite)} scenarios (best of {args.repeat})")
+    results = run(suite, args.repeat)
+
+    if args.save:
+        try:
+            with open(args.baseline) as file:
+                baseline = json.load(file)
+        except FileNotFoundError:
+            baseline = {'scenarios': {}, 'work': {}}
+        # Scenarios not run this time keep their old baseline
+        results['scenarios'] = {**baseline['scenarios'], **results['scenarios']}
+        results['work'] = {**baseline.get('work', {}), **results['work']}
+        with open(args.baseline, "w") as file:
+            json.dump(results, file, indent=1, sort_keys=True)
+        print(f"saved {len(results['scenarios'])} scenarios to {args.baseline}")
+        return
+
+    try:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+    except FileNotFoundError:
+        print(f"no baseline at {args.baseline}; run with --save to make one")
+        return
+    confirm(suite, results, baseline, args.time_threshold, args.repeat)
+    print()
+    regressions = compare(results, baseline, args.threshold, args.time_threshold)
+    limits = f"{args.threshold:.0%} more work or {args.time_threshold:.0%} more time"
+    if regressions:
+        print(f"\n{len(regressions)} scenario(s) regressed by more than {limits}")
+        sys.exit(1)
+    print(f"\nno scenario regressed by more than {limits}")
+
+
+if __name__ == '__main__':
+    main()
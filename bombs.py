@@ -0,0 +1,55 @@
+import heapq
+
+
+class BombRegistry:
+    """The bombs on the board, indexed by position and queued by fuse.
+
+    Fuses sit in a min-heap keyed on each bomb's timestamp, so finding the bombs
+    that are due is O(log n) per bomb whatever their order of placement. Triggering
+    a bomb (chain reactions) re-queues it with timestamp 0; the entry it had before
+    is recognised as stale when it comes up and dropped.
+    """
+
+    def __init__(self):
+        self.by_pos = {}
+        self.fuses = []
+        self.order = 0  # Keeps bombs with equal timestamps in placement order
+
+    def __len__(self):
+        return len(self.by_pos)
+
+    def __iter__(self):
+        return iter(list(self.by_pos.values()))
+
+    def __contains__(self, pos):
+        return pos in self.by_pos
+
+    def get(self, pos):
+        return self.by_pos.get(pos)
+
+    def add(self, circle):
+        self.by_pos[circle.pos] = circle
+        self.push(circle)
+
+    def push(self, circle):
+        heapq.heappush(self.fuses, (circle.timestamp, self.order, circle))
+        self.order += 1
+
+    def trigger(self, pos):
+        """Makes the bomb at pos, if any, go off on the next pop_due; True if it wasn't set off already"""
+        circle = self.by_pos.get(pos)
+        if circle is not None and circle.timestamp != 0:
+            circle.timestamp = 0  # Set the timestamp to explode immediately
+            self.push(circle)
+            return True
+        return False
+
+    def pop_due(self, deadline):
+        """Removes and returns a bomb placed before deadline, or None if no bomb is due"""
+        fuses = self.fuses
+        while fuses and fuses[0][0] < deadline:
+            timestamp, _, circle = heapq.heappop(fuses)
+            if circle.timestamp == timestamp and self.by_pos.get(circle.pos) is circle:
+                del self.by_pos[circle.pos]
+                return circle
+        return None
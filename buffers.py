@@ -0,0 +1,41 @@
+from array import array
+
+# Stamps are 16 bit; when the generations run out they are all cleared once
+MAX_GENERATION = 0xFFFF - 1
+
+
+class SearchBuffers:
+    """Per-cell search state over a grid of cells cells, reused from one search to the next.
+
+    distance and toward hold a value for each cell y*width+x, but only count for
+    the cells whose stamp holds the current generation: start() begins a new
+    search by moving to the next generation instead of clearing the arrays. A
+    search then touches only the cells it reaches, however big the grid, and
+    allocates nothing for its state. A cell stamped generation + 1 is closed, for
+    searches that need to tell reached cells from finished ones.
+    """
+
+    __slots__ = ('cells', 'stamp', 'distance', 'toward', 'generation')
+
+    def __init__(self, cells):
+        self.cells = cells
+        self.stamp = array('H', [0]) * cells
+        self.distance = array('i', [0]) * cells
+        self.toward = array('i', [0]) * cells
+        self.generation = 0
+
+    def start(self):
+        """Forgets the previous search and returns the new generation"""
+        self.generation += 2
+        if self.generation > MAX_GENERATION:
+            self.stamp = array('H', [0]) * self.cells
+            self.generation = 2
+        return self.generation
+
+    def __contains__(self, index):
+        return self.stamp[index] >= self.generation
+
+    def reached(self):
+        """Flat indices of the cells the current search reached, in index order"""
+        generation = self.generation
+        return [index for index, stamp in enumerate(self.stamp) if stamp >= generation]
@@ -0,0 +1,92 @@
+from array import array
+from npgrid import is_array, find_bombs
+
+
+class DangerMap:
+    """Counts, for every cell, how many bomb blasts would reach it.
+
+    Kept up to date as bombs are placed and removed, so asking whether a cell
+    is dangerous is a single array lookup instead of a scan for nearby bombs.
+    Blasts stop at walls, the same way Circle.create_explosion does.
+    on_change(index), if given, is called for every cell that becomes or stops
+    being dangerous.
+    """
+
+    def __init__(self, grid, radius=2, on_change=None):
+        self.grid = grid
+        self.radius = radius
+        self.on_change = on_change
+        self.width = len(grid[0])
+        self.height = len(grid)
+
+        # Cells are addressed as y*width+x; an array rather than a list, so the
+        # garbage collector has nothing to walk on big maps
+        self.counts = array('H', bytes(2 * self.width * self.height))
+
+        # Bomb position -> cells its blast reaches
+        self.blasts = {}
+
+    @classmethod
+    def from_grid(cls, grid, radius=2):
+        """Builds a danger map for every bomb (value 2) already on the grid"""
+        danger = cls(grid, radius)
+        if is_array(grid):
+            for pos in find_bombs(grid):
+                danger.add_bomb(pos)
+            return danger
+
+        for y, row in enumerate(grid):
+            for x, cell in enumerate(row):
+                if cell == 2:
+                    danger.add_bomb((x, y))
+        return danger
+
+    def blast_cells(self, pos):
+        """Cells reached by a bomb at pos: the bomb itself and up to radius cells each way, stopping at walls"""
+        x, y = pos
+        width = self.width
+        cells = [y * width + x]
+        for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+            for i in range(1, self.radius + 1):
+                nx, ny = x + dx * i, y + dy * i
+                if not (0 <= nx < width and 0 <= ny < self.height):
+                    break
+                cells.append(ny * width + nx)
+                if self.grid[ny][nx] == 1:  # The wall takes the blast
+                    break
+        return cells
+
+    def add_bomb(self, pos):
+        if pos in self.blasts:
+            return
+        cells = self.blast_cells(pos)
+        counts = self.counts
+        for index in cells:
+            counts[index] += 1
+            if counts[index] == 1 and self.on_change is not None:
+                self.on_change(index)
+        self.blasts[pos] = cells
+
+    def remove_bomb(self, pos):
+        cells = self.blasts.pop(pos, None)
+        if cells is None:
+            return
+        counts = self.counts
+        for index in cells:
+            counts[index] -= 1
+            if not counts[index] and self.on_change is not None:
+                self.on_change(index)
+
+    def wall_removed(self, pos):
+        """Re-spreads the blasts of bombs in line with a wall that was just destroyed"""
+        x, y = pos
+        for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+            for i in range(1, self.radius + 1):
+                bomb = (x + dx * i, y + dy * i)
+                if bomb in self.blasts:
+                    self.remove_bomb(bomb)
+                    self.add_bomb(bomb)
+
+    def is_dangerous(self, pos):
+        x, y = pos
+        return self.counts[y * self.width + x] > 0
@@ -1,124 +1,233 @@
-class Node:
-    """A node class for A* Pathfinding"""
+import heapq
+import npgrid
+from danger import DangerMap
+from buffers import SearchBuffers
 
-    def __init__(self, parent=None, position=None):
-        self.parent = parent
-        self.position = position
 
-        self.g = 0
-        self.h = 0
-        self.f = 0
-
-    def __eq__(self, other):
-        return self.position == other.position
-
-
-def simulate_explosions(maze):
+def simulate_explosions(maze, danger=None):
     """Simulate explosions by converting bombs (2) to fire (3) based on their explosion radius"""
-    
-    # theres a bug here it shouldnt simulate past walls
-    
-    rows = len(maze)
-    cols = len(maze[0])
-    new_maze = [row[:] for row in maze]  # Copy of the maze
-
-    directions = [(1, 0), (-1, 0), (0, 1), (0, -1)]
-
-    for y in range(rows):
-        for x in range(cols):
-            if maze[y][x] == 2:  # Found a bomb
-                # Convert the bomb itself to fire
-                new_maze[y][x] = 3
-                # Spread the explosion in the four directions
-                for dx, dy in directions:
-                    for i in range(1, 3):  # Radius of 2
-                        nx, ny = x + dx * i, y + dy * i
-                        if 0 <= nx < cols and 0 <= ny < rows:
-                            if new_maze[ny][nx] != 1:  # Only spread fire over empty cells
-                                new_maze[ny][nx] = 3
-
-    return new_maze
+    if danger is None and npgrid.is_array(maze):
+        return npgrid.simulate_explosions(maze)
+    if danger is None:
+        danger = DangerMap.from_grid(maze)
 
+    width = len(maze[0])
+    new_maze = [list(row) for row in maze]  # Copy of the maze
 
-def defend_astar(maze, start):
-    """Returns a list of tuples as a path from the given start to the nearest safe spot (0 or -1)"""
-    maze = simulate_explosions(maze)
-    
-    # Create start node
-    start_node = Node(None, start)
-    start_node.g = start_node.h = start_node.f = 0
+    for y, row in enumerate(new_maze):
+        for x in range(width):
+            if danger.counts[y * width + x] and row[x] != 1:  # Walls stop the fire
+                row[x] = 3
 
-    # Initialize both open and closed list
-    open_list = []
-    closed_list = []
+    return new_maze
 
-    # Add the start node
-    open_list.append(start_node)
 
-    # Track the closest safe spot
-    closest_safe_spot = None
+def defend_astar(maze, start, danger=None, stats=None, buffers=None):
+    """Returns a list of tuples as a path from the given start to the nearest safe spot (0 or -1)
+
+    Cells reached by a bomb blast in danger (the game's DangerMap, or one built from
+    the maze) count as fire, so the maze itself is never copied. If stats is a dict,
+    the number of nodes expanded is stored in stats['expanded']. buffers, a
+    SearchBuffers as big as the maze, holds the search state; pass the same one to
+    every call to keep the search from allocating it each time.
+    """
+    if danger is None:
+        danger = DangerMap.from_grid(maze)
+    danger_counts = danger.counts
+    width = len(maze[0])
+    height = len(maze)
+    start_x, start_y = start
+    cells = npgrid.flat_cells(maze)  # Flat view of a numpy grid, None for lists
+
+    # Cells are addressed as y*width+x; a cell's g and parent only count when it is
+    # stamped with this search's generation (reached) or the one after (expanded)
+    if buffers is None:
+        buffers = SearchBuffers(width * height)
+    reached = buffers.start()
+    closed = reached + 1
+    stamp, g_score, parent = buffers.stamp, buffers.distance, buffers.toward
+    start_index = start_y * width + start_x
+    stamp[start_index] = reached
+    g_score[start_index] = 0
+    parent[start_index] = -1
+
+    # Open set entries are (f, order, index): the insertion order breaks ties the
+    # same way the old linear scan did (first inserted wins)
+    open_heap = [(0, 0, start_index)]
+    order = 1
+    expanded = 0
 
     # Loop until you find a safe spot or exhaust all possibilities
-    while len(open_list) > 0:
-        # Get the current node
-        current_node = open_list[0]
-        current_index = 0
-        for index, item in enumerate(open_list):
-            if item.f < current_node.f:
-                current_node = item
-                current_index = index
-
-        # Pop current off open list, add to closed list
-        open_list.pop(current_index)
-        closed_list.append(current_node)
+    while open_heap:
+        # Pop the lowest f, skipping stale duplicates of already expanded cells
+        current = heapq.heappop(open_heap)[2]
+        if stamp[current] == closed:
+            continue
+        stamp[current] = closed
+        expanded += 1
 
         # Check if we've reached a safe spot
-        x, y = current_node.position
-        if maze[y][x] == 0 or maze[y][x] == -1:
+        cell = maze[current // width][current % width] if cells is None else cells[current]
+        if (cell == 0 or cell == -1) and not danger_counts[current]:
+            if stats is not None:
+                stats['expanded'] = expanded
             path = []
-            current = current_node
-            while current is not None:
-                path.append(current.position)
-                current = current.parent
-            return path[::-1]  # Return reversed path
+            while current != -1:
+                path.append((current % width, current // width))
+                current = parent[current]
+            return path[::-1]
 
         # Generate children (only horizontal and vertical moves)
-        children = []
-        for new_position in [(1, 0), (-1, 0), (0, 1), (0, -1)]:  # Adjacent squares without diagonals
-
-            # Get node position
-            node_position = (x + new_position[0], y + new_position[1])
+        y, x = divmod(current, width)
+        for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+            nx, ny = x + dx, y + dy
 
             # Make sure within range
-            if node_position[0] > (len(maze[0]) - 1) or node_position[0] < 0 or node_position[1] > (len(maze) - 1) or node_position[1] < 0:
+            if nx < 0 or nx >= width or ny < 0 or ny >= height:
                 continue
 
-            # Skip impassable terrain: walls (1)
-            if maze[node_position[1]][node_position[0]] == 1:
+            child = ny * width + nx
+            child_stamp = stamp[child]
+            if child_stamp == closed:
                 continue
 
-            # Create new node with a higher cost for moving into fire
-            new_node = Node(current_node, node_position)
-            new_node.g = current_node.g + (2 if maze[node_position[1]][node_position[0]] == 3 else 1)  # Higher cost for fire
-            new_node.h = ((new_node.position[0] - start[0]) ** 2) + ((new_node.position[1] - start[1]) ** 2)
-            new_node.f = new_node.g + new_node.h
-
-            # Skip nodes already in the closed list
-            if new_node in closed_list:
+            # Skip impassable terrain: walls (1)
+            cell = maze[ny][nx] if cells is None else cells[child]
+            if cell == 1:
                 continue
 
-            # Skip nodes already in the open list with a lower g value
-            if any(child == new_node and new_node.g > child.g for child in open_list):
+            # Higher cost for moving into fire; a queued entry for this cell may already be as cheap
+            child_g = g_score[current] + (2 if cell == 3 or danger_counts[child] else 1)
+            if child_stamp == reached and g_score[child] <= child_g:
                 continue
+            stamp[child] = reached
+            g_score[child] = child_g
+            parent[child] = current
 
-            # Add the new node to the open list
-            open_list.append(new_node)
-    
+            # The heuristic favours cells near the start, so the nearest safe spot wins
+            h = (nx - start_x) ** 2 + (ny - start_y) ** 2
+            heapq.heappush(open_heap, (child_g + h, order, child))
+            order += 1
 
+    if stats is not None:
+        stats['expanded'] = expanded
     # If no path was found, return None
     return None
 
 
+def escape_field(maze, danger=None, stats=None, unsafe=None, buffers=None):
+    """Runs one multi-source search out of every safe spot (0 or -1 outside any blast) over the whole maze
+
+    Returns the SearchBuffers it searched in (a new one unless buffers is given):
+    for each cell y*width+x reached, distance holds the cost of its cheapest escape
+    (moving into fire costs 2, like defend_astar) and toward the next cell on that
+    escape, -1 when the cell is already safe. Every NPC in defend mode can then
+    share one field. If stats is a dict, the number of cells expanded is stored in
+    stats['expanded'].
+
+    An escape never needs to cross a safe spot, so on a big map the search can stay
+    among the cells that aren't safe: pass unsafe, the flat indices of the cells
+    that may not be safe besides the blast cells of danger (fire, cells someone
+    stands on), and only those cells and the safe spots next to them are searched.
+    """
+    if danger is None:
+        danger = DangerMap.from_grid(maze)
+    danger_counts = danger.counts
+    width = len(maze[0])
+    height = len(maze)
+
+    if buffers is None:
+        buffers = SearchBuffers(width * height)
+    reached = buffers.start()
+    stamp, distance, toward = buffers.stamp, buffers.distance, buffers.toward
+    cells = npgrid.flat_cells(maze)  # Flat view of a numpy grid, None for lists
+
+    def value(index):
+        return maze[index // width][index % width] if cells is None else cells[index]
+
+    def is_safe(index):
+        cell = value(index)
+        return (cell == 0 or cell == -1) and not danger_counts[index]
+
+    if unsafe is not None:
+        # The cells to search, and the safe spots bordering them as the sources
+        searched = set(unsafe)
+        for blast in danger.blasts.values():
+            searched.update(blast)
+        searched = {index for index in searched if value(index) != 1 and not is_safe(index)}
+        queue = []
+        for index in searched:
+            y, x = divmod(index, width)
+            for nx, ny in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+                neighbour = ny * width + nx
+                if 0 <= nx < width and 0 <= ny < height and stamp[neighbour] != reached and is_safe(neighbour):
+                    stamp[neighbour] = reached
+                    queue.append((0, neighbour))
+    elif cells is not None:
+        searched = None
+        queue = [(0, index) for index in npgrid.safe_cells(maze, danger_counts)]
+    else:
+        searched = None
+        queue = []
+        for y, row in enumerate(maze):
+            for x, cell in enumerate(row):
+                index = y * width + x
+                if (cell == 0 or cell == -1) and not danger_counts[index]:
+                    queue.append((0, index))
+    for _, index in queue:
+        stamp[index] = reached
+        distance[index] = 0
+        toward[index] = -1
+
+    # Searching backwards, stepping from a cell into the popped one costs what entering it costs
+    expanded = 0
+    while queue:
+        current_distance, current = heapq.heappop(queue)
+        if current_distance > distance[current]:
+            continue
+        expanded += 1
+
+        y, x = divmod(current, width)
+        cell = maze[y][x] if cells is None else cells[current]
+        on_fire = cell == 3 or danger_counts[current]
+        new_distance = current_distance + (2 if on_fire else 1)
+
+        for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+            nx, ny = x + dx, y + dy
+            if not (0 <= nx < width and 0 <= ny < height):
+                continue
+            neighbour = ny * width + nx
+            if searched is not None and neighbour not in searched:
+                continue
+            if (maze[ny][nx] if cells is None else cells[neighbour]) == 1:
+                continue
+            if stamp[neighbour] != reached or new_distance < distance[neighbour]:
+                stamp[neighbour] = reached
+                distance[neighbour] = new_distance
+                toward[neighbour] = current
+                heapq.heappush(queue, (new_distance, neighbour))
+
+    if stats is not None:
+        stats['expanded'] = expanded
+    return buffers
+
+
+def escape_path(field, start, width):
+    """Reads the path from start to its nearest safe spot out of an escape_field, or None if there is none"""
+    x, y = start
+    index = y * width + x
+    if index not in field:
+        return None
+
+    toward = field.toward
+    path = [start]
+    while toward[index] != -1:
+        index = toward[index]
+        y, x = divmod(index, width)
+        path.append((x, y))
+    return path
+
+
 def main():
     maze = [[-1, 0, 1, 0, 1, 1, 1, 1, 1, 0],
             [0, 1, 1, 1, 1, 1, 1, 1, 1, 1],
@@ -138,9 +247,11 @@ def main():
 
     # Find the shortest path to a safe spot
     path = defend_astar(maze, start)
+    field_path = escape_path(escape_field(maze), start, len(maze[0]))
     
     if path:
         print("Safe path found:", path)
+        print("Escape field path:", field_path)
     else:
         print("No safe path available.")
 
@@ -0,0 +1,108 @@
+from array import array
+
+# Event kinds; every event also carries a cell (x, y) and a detail
+BOMB_PLACED = 1   # The bomb's cell; detail: the icon of who placed it
+DETONATION = 2    # The bomb's cell
+CHAIN = 3         # Cell of a bomb an explosion set off, which goes off in the same pass
+FIRE_EXPIRED = 4  # A cell whose fire went out
+MODE_SWITCH = 5   # The NPC's cell; detail: (icon, defend_mode) it switched to
+DEATH = 6         # Where it died; detail: (icon, message)
+ROUND_OVER = 7    # (0, 0); detail: (winner, message), after the scores were updated
+
+NAMES = {BOMB_PLACED: 'bomb_placed', DETONATION: 'detonation', CHAIN: 'chain', FIRE_EXPIRED: 'fire_expired',
+         MODE_SWITCH: 'mode_switch', DEATH: 'death', ROUND_OVER: 'round_over'}
+
+CAPACITY = 1024  # Events a tick can hold before the oldest are dropped
+
+
+class EventBus:
+    """Game events written to a preallocated ring and handed out once per tick.
+
+    The game emits each event as it happens; at the end of the tick flush() calls
+    every subscriber once with the tick's events, as (kind, x, y, detail) tuples,
+    so nothing a subscriber does runs in the middle of the rules. With no
+    subscriber emit returns at once and nothing is stored. A tick with more than
+    capacity events loses its oldest ones, which dropped counts.
+    """
+
+    def __init__(self, capacity=CAPACITY):
+        self.capacity = capacity
+        self.kinds = array('B', bytes(capacity))
+        self.xs = array('i', bytes(4 * capacity))
+        self.ys = array('i', bytes(4 * capacity))
+        self.details = [None] * capacity
+        self.head = 0  # Events written so far
+        self.tail = 0  # Events handed out (or dropped) so far
+        self.subscribers = []
+        self.active = False  # Whether anyone listens, for callers that want to skip preparing an event
+
+        self.emitted = 0
+        self.dropped = 0
+        self.batches = 0
+
+    def subscribe(self, subscriber):
+        """Calls subscriber(tick, events) at the end of every tick that had events"""
+        self.subscribers.append(subscriber)
+        self.active = True
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.remove(subscriber)
+        self.active = bool(self.subscribers)
+
+    def emit(self, kind, x=0, y=0, detail=None):
+        if not self.active:
+            return
+        slot = self.head % self.capacity
+        self.kinds[slot] = kind
+        self.xs[slot] = x
+        self.ys[slot] = y
+        self.details[slot] = detail
+        self.head += 1
+        self.emitted += 1
+        if self.head - self.tail > self.capacity:
+            self.tail += 1  # Overwritten
+            self.dropped += 1
+
+    def flush(self, tick):
+        """Hands the events emitted since the last flush to every subscriber, in one batch"""
+        if self.head == self.tail:
+            return
+        capacity = self.capacity
+        events = []
+        for n in range(self.tail, self.head):
+            slot = n % capacity
+            events.append((self.kinds[slot], self.xs[slot], self.ys[slot], self.details[slot]))
+            self.details[slot] = None  # Don't keep the detail alive
+        self.tail = self.head
+        self.batches += 1
+        for subscriber in self.subscribers:
+            subscriber(tick, events)
+
+    def report(self):
+        return f"events: {self.emitted} emitted in {self.batches} batches, {self.dropped} dropped"
+
+
+class EventLog:
+    """Subscriber writing one line per event to a text file, through its buffer"""
+
+    def __init__(self, file):
+        self.file = file
+
+    def __call__(self, tick, events):
+        self.file.write("".join(f"{tick} {NAMES[kind]} {x} {y} {detail if detail is not None else ''}\n"
+                                for kind, x, y, detail in events))
+
+
+class EventCounts:
+    """Subscriber counting the events of each kind"""
+
+    def __init__(self):
+        self.counts = dict.fromkeys(NAMES.values(), 0)
+
+    def __call__(self, tick, events):
+        counts = self.counts
+        for kind, _, _, _ in events:
+            counts[NAMES[kind]] += 1
+
+    def report(self):
+        return ", ".join(f"{count} {name}" for name, count in self.counts.items())
@@ -0,0 +1,58 @@
+import heapq
+from array import array
+
+
+class Fire:
+    """The fire on the board after explosions.
+
+    Each cell keeps a count of the explosions burning on it in a flat array
+    (y*width+x), and explosions wait in a min-heap on their expiry time, so a
+    tick only touches the explosions that are actually due. Whether an entity
+    stands in fire is a single lookup of its cell.
+    """
+
+    def __init__(self, width, height, duration=0.5):
+        self.width = width
+        self.duration = duration  # Time to reset the cells after the fire phase
+        self.counts = array('H', bytes(2 * width * height))
+        self.expiries = []
+        self.order = 0
+
+    def __len__(self):
+        """Number of explosions still burning"""
+        return len(self.expiries)
+
+    def ignite(self, cells, now):
+        """Sets fire to cells, given as (y, x), until duration has passed"""
+        counts = self.counts
+        width = self.width
+        for y, x in cells:
+            counts[y * width + x] += 1
+        heapq.heappush(self.expiries, (now + self.duration, self.order, cells))
+        self.order += 1
+
+    def expire(self, now):
+        """Puts out the explosions that are due and returns the cells, as (y, x), no longer burning"""
+        expiries = self.expiries
+        counts = self.counts
+        width = self.width
+        cleared = []
+        while expiries and expiries[0][0] <= now:
+            _, _, cells = heapq.heappop(expiries)
+            for y, x in cells:
+                index = y * width + x
+                counts[index] -= 1
+                if not counts[index]:
+                    cleared.append((y, x))
+        return cleared
+
+    def burning(self):
+        """Flat indices (y*width+x) of the cells on fire, once per explosion on them"""
+        width = self.width
+        for _, _, cells in self.expiries:
+            for y, x in cells:
+                yield y * width + x
+
+    def is_burning(self, pos):
+        x, y = pos
+        return self.counts[y * self.width + x] > 0
@@ -0,0 +1,862 @@
+import time
+import random
+import npgrid
+import mapgen
+from attack import attack_astar, pursuit_field, pursuit_path
+from defend import defend_astar, escape_field, escape_path
+from planner import AttackPlanner
+from danger import DangerMap
+from bombs import BombRegistry
+from fire import Fire
+from profiler import NullProfiler
+from buffers import SearchBuffers
+from pathcache import PathCache, HASHED, MISSING, cell_key, walls_hash
+from events import EventBus, BOMB_PLACED, DETONATION, CHAIN, FIRE_EXPIRED, MODE_SWITCH, DEATH, ROUND_OVER
+
+SIZE = 10 
+
+PERCENTAGE = 70
+
+# NPCs in defend mode read their escape from one shared field per tick instead of
+# each running defend_astar
+ESCAPE_FIELD = True
+
+# NPCs in attack mode repair their previous search with an AttackPlanner instead of
+# running attack_astar from scratch
+INCREMENTAL_ATTACK = True
+
+# In a crowd (more than one NPC), NPCs in attack mode read their path from one
+# shared pursuit field per target per tick instead of each planning their own
+PURSUIT_FIELD = True
+
+# Crowd NPCs spawn at least this many steps away from the player
+CROWD_SPAWN_DISTANCE = 5
+
+# Grid values
+WALL = 1
+PLAYER = -1
+ENEMY = PLAYER2 = -2
+
+CIRCLE = 2
+FIRE = 3
+
+# Values no NPC path goes through
+BLOCKING = (WALL, CIRCLE, FIRE)
+
+move_interval = 0.25  # Seconds between NPC steps
+
+FUSE = 3  # Seconds from placing a bomb to its explosion
+
+class Circle:
+    __slots__ = ('pos', 'radius', 'timestamp', 'owner')
+
+    def __init__(self, pos, owner, timestamp):
+        self.pos = pos
+        self.radius = 2
+        self.timestamp = timestamp
+        self.owner = owner
+    
+    @staticmethod
+    def detonate_circles(game):
+        circles = game.circles
+        while True:
+            # FUSE seconds to detonate; bombs triggered by these explosions go off in the same pass
+            circle = circles.pop_due(game.clock() - FUSE)
+            if circle is None:
+                break
+            game.level_map.remove_bomb(circle.pos)
+            game.events.emit(DETONATION, *circle.pos)
+            Circle.create_explosion(game, circle)
+            circle.owner.available_circles += 1
+    
+    @staticmethod
+    def create_explosion(game, circle):
+        grid = game.level_map.grid
+        SIZE = game.size
+        x, y = circle.pos
+        explosion_cells = []
+
+        # Horizontal explosion to the right
+        for i in range(1, circle.radius+1):
+            if x+i < SIZE:
+                explosion_cells.append((y, x+i))
+                if grid[y][x+i] == WALL:
+                    break
+                elif grid[y][x+i] == CIRCLE:
+                    Circle.trigger_bomb(game, x+i, y)
+                    break
+        
+        # Horizontal explosion to the left
+        for i in range(1, circle.radius+1):
+            if x-i >= 0:
+                explosion_cells.append((y, x-i))
+                if grid[y][x-i] == WALL:
+                    break
+                elif grid[y][x-i] == CIRCLE:
+                    Circle.trigger_bomb(game, x-i, y)
+                    break
+        
+        # Vertical explosion downward
+        for i in range(1, circle.radius+1):
+            if y+i < SIZE:
+                explosion_cells.append((y+i, x))
+                if grid[y+i][x] == WALL:
+                    break
+                elif grid[y+i][x] == CIRCLE:
+                    Circle.trigger_bomb(game, x, y+i)
+                    break
+        
+        # Vertical explosion upward
+        for i in range(1, circle.radius+1):
+            if y-i >= 0:
+                explosion_cells.append((y-i, x))
+                if grid[y-i][x] == WALL:
+                    break
+                elif grid[y-i][x] == CIRCLE:
+                    Circle.trigger_bomb(game, x, y-i)
+                    break
+        
+        # The initial position where the bomb explodes
+        explosion_cells.append((y, x))
+        
+        # Set the explosion on the grid and remove walls
+        destroyed_walls = []
+        for (cy, cx) in explosion_cells:
+            if grid[cy][cx] == WALL:
+                destroyed_walls.append((cx, cy))
+            game.level_map.set(cx, cy, FIRE)
+        for wall in destroyed_walls:
+            game.level_map.remove_wall(wall)
+            
+        game.fire.ignite(explosion_cells, game.clock())
+
+    @staticmethod
+    def trigger_bomb(game, x, y):
+        """Trigger a bomb at the specified location."""
+        if game.circles.trigger((x, y)):
+            game.events.emit(CHAIN, x, y)
+
+    @staticmethod
+    def update_explosions(game):
+        level_map = game.level_map
+        fire = game.fire
+
+        # Check if the player or enemy is in the fire area during fire phase
+        if len(fire):
+            if fire.is_burning(game.player.pos):
+                game.kill(game.player, "was hit by the fire")
+                return
+            if game.humans == 2 and fire.is_burning(game.enemy.pos):
+                game.kill(game.enemy, "was hit by the fire")
+                return
+            for npc in list(game.npcs):
+                if fire.is_burning(npc.pos):
+                    game.kill(npc, "was hit by the fire")
+                    if game.winner is not None:
+                        return
+
+        # Reset the cells whose last explosion is done
+        events = game.events
+        for y, x in fire.expire(game.clock()):
+            level_map.set(x, y, 0)
+            events.emit(FIRE_EXPIRED, x, y)
+
+class Player:
+    __slots__ = ('game', 'pos', 'icon', 'available_circles', 'directions')
+
+    def __init__(self, game, number=1):
+        self.game = game
+        SIZE = game.size
+        
+        self.pos = (0, 0) if number == 1 else (SIZE-1, SIZE-1)
+        self.icon = "🔴" if number == 1 else "🔵"
+        
+        self.available_circles = 4
+        self.directions = ['w', 's', 'a', 'd'] if number == 1 else ['i', 'k', 'j', 'l']
+        
+    def put_circle(self, circles, grid):
+        if self.pos in circles: # don't allow putting 2 bombs on same place
+            return
+        
+        if self.available_circles > 0:
+            circle = Circle(self.pos, owner=self, timestamp=self.game.clock())
+            circles.add(circle)
+            x, y = self.pos
+            self.game.level_map.set(x, y, CIRCLE)
+            self.game.level_map.add_bomb(self.pos)
+            self.game.events.emit(BOMB_PLACED, x, y, self.icon)
+            self.game.bombs_placed += 1
+            self.available_circles -= 1
+    
+    def move_player(self, direction, grid, enemy_pos):
+        SIZE = self.game.size
+        x, y = self.pos
+        other_player = PLAYER2 if self.icon == "🔴" else PLAYER
+        
+        new_x, new_y = x, y
+
+        # Determine the new position based on the direction
+        if direction == self.directions[0] and y > 0 and grid[y-1][x] != WALL and grid[y-1][x] != CIRCLE:
+            new_y -= 1
+        elif direction == self.directions[1] and y < SIZE-1 and grid[y+1][x] != WALL and grid[y+1][x] != CIRCLE:
+            new_y += 1
+        elif direction == self.directions[2] and x > 0 and grid[y][x-1] != WALL and grid[y][x-1] != CIRCLE:
+            new_x -= 1
+        elif direction == self.directions[3] and x < SIZE-1 and grid[y][x+1] != WALL and grid[y][x+1] != CIRCLE:
+            new_x += 1
+
+        # If the player moved, update the grid
+        if (new_x, new_y) != (x, y):
+            level_map = self.game.level_map
+            if (x,y) == enemy_pos:
+                level_map.put(x, y, other_player)
+            elif grid[y][x] != other_player:
+                level_map.put(x, y, 0)
+                
+                if (x, y) in self.game.circles:
+                    level_map.put(x, y, CIRCLE)
+
+            # If the new position is fire, the player loses
+            if grid[new_y][new_x] == FIRE:
+                self.game.kill(self, "walked into the fire", (new_x, new_y))
+                return
+
+            # Update the grid to reflect the player's new position
+            if grid[new_y][new_x] != other_player:
+                level_map.put(new_x, new_y, PLAYER if self.icon == "🔴" else PLAYER2)
+            if (new_y, new_x) != enemy_pos:
+                level_map.put(new_x, new_y, PLAYER if self.icon == "🔴" else PLAYER2)
+
+            # Update the player's position
+            self.pos = (new_x, new_y)
+
+class Enemy:
+    __slots__ = ('game', 'pos', 'icon', 'value', 'other', 'available_circles', 'next_moves', 'last_move_time',
+                 'defend_mode', 'move_interval', 'searched', 'planner', 'pooled', 'lookahead', 'idle')
+
+    def __init__(self, game, icon="🔵", pos=None, value=ENEMY):
+        self.game = game
+        self.pos = pos if pos is not None else (game.size-1, game.size-1)
+        self.icon = icon
+
+        # Grid value drawn for this NPC and for the side it is hunting, so an NPC
+        # can also stand in for the player in NPC-vs-NPC games
+        self.value = value
+        self.other = PLAYER if value == ENEMY else ENEMY
+        self.available_circles = 4
+        self.next_moves = []  # Steps still to take, the next one last so taking it is a pop()
+        self.last_move_time = 0
+        self.defend_mode = False
+        self.move_interval = 0.2
+        self.searched = 0  # Cells expanded by this NPC's attack searches this tick
+
+        # The blue NPCs take each step from the game's lookahead search, if it has one
+        self.lookahead = game.lookahead if value == ENEMY else None
+
+        # What its searches were given the last time they found nothing to do
+        self.idle = None
+
+        # Search kept between attack plans, told about every cell that changes;
+        # a crowd shares pursuit fields instead, and with a planning pool the
+        # attack plans come from its workers
+        self.planner = None
+        self.pooled = game.planning is not None and not (game.crowd and PURSUIT_FIELD)
+        if not (game.crowd and PURSUIT_FIELD) and not self.pooled:
+            self.planner = AttackPlanner(game.level_map.grid, game.level_map.danger)
+            game.level_map.watch(self.planner.cell_changed)
+    
+    def put_circle(self, circles, grid):
+        if self.pos in circles: # don't allow putting 2 bombs on same place
+            return
+        
+        if self.available_circles > 0:
+            circle = Circle(self.pos, owner=self, timestamp=self.game.clock())
+            circles.add(circle)
+            
+            x, y = self.pos
+            self.game.level_map.set(x, y, CIRCLE)
+            self.game.level_map.add_bomb(self.pos)
+            self.game.events.emit(BOMB_PLACED, x, y, self.icon)
+            self.game.bombs_placed += 1
+            
+            self.available_circles -= 1
+            
+    def compute_next_moves(self, grid, player_pos):
+        level_map = self.game.level_map
+        profiler = self.game.profiler
+        stats = self.game.search_stats
+        started = time.perf_counter()
+        with profiler.phase('compute_next_moves'):
+            if self.defend_mode or self.are_circles_nearby(grid):
+                if ESCAPE_FIELD:
+                    # The field is only searched by the first NPC to flee this tick
+                    fresh = level_map.escape is None
+                    with profiler.phase('escape_field' if fresh else 'escape_path'):
+                        path = level_map.escape_path(self.pos, stats, self.game.unsafe_cells())
+                    if fresh:
+                        profiler.count('escape_field.nodes', stats['expanded'])
+                else:
+                    with profiler.phase('defend_astar'):
+                        path = self.cached_search('defend', None, None,
+                                                  lambda: defend_astar(grid, self.pos, level_map.danger, stats,
+                                                                       level_map.buffers_for('defend')))
+                    profiler.count('defend_astar.nodes', stats['expanded'])
+            else:
+                path = None
+                if self.pooled:
+                    with profiler.phase('planning_pool'):
+                        path = self.game.planning.plan(self, player_pos)
+                    if path is None:
+                        # No new plan within this tick's deadline: keep following the last one
+                        self.game.planning_time += time.perf_counter() - started
+                        return self.next_moves
+                elif self.planner is None:
+                    # The field is only searched by the first NPC hunting this target this tick
+                    fresh = player_pos not in level_map.pursuit
+                    with profiler.phase('pursuit_field' if fresh else 'pursuit_path'):
+                        path = level_map.pursuit_path(self.pos, player_pos, stats, self.game.entity_cells())
+                    if fresh:
+                        profiler.count('pursuit_field.nodes', stats['expanded'])
+                elif INCREMENTAL_ATTACK:
+                    with profiler.phase('attack_planner'):
+                        path = self.planner.plan(self.pos, player_pos, stats, self.search_budget())
+                    profiler.count('attack_planner.nodes', stats['expanded'])
+                    self.searched += stats['expanded']
+                if path is None and self.planner is not None:
+                    # Unreachable (or not incremental): head for the closest cell instead.
+                    # Crowd NPCs the field doesn't reach wait for the next tick's field
+                    budget = self.search_budget()
+                    with profiler.phase('attack_astar'):
+                        path = self.cached_search('attack', player_pos, budget,
+                                                  lambda: attack_astar(grid, self.pos, player_pos, level_map.danger, stats,
+                                                                       budget, level_map.buffers_for('attack')))
+                    profiler.count('attack_astar.nodes', stats['expanded'])
+                    self.searched += stats['expanded']
+        self.game.planning_time += time.perf_counter() - started
+            
+        if path is None or len(path) <= 1:  # No path found or no moves to make
+            return []
+        return path[:0:-1]  # Reversed, skipping the current position
+
+    def cached_search(self, mode, goal, budget, search):
+        """search()'s path from this NPC's cell, or the one it gave last time the grid and the query were the same"""
+        game = self.game
+        key = (game.level_map.hash, self.pos, goal, mode, budget)
+        path = game.path_cache.get(key)
+        if path is MISSING:
+            path = search()
+            game.path_cache.put(key, path)
+        else:
+            game.search_stats['expanded'] = 0
+        return path
+
+    def idle_key(self, target_pos):
+        """Everything compute_next_moves depends on, or None when that isn't all
+
+        The grid hash covers the walls, bombs, fire and NPCs; with a search budget
+        an unfinished search goes on at the next call, and a pool's plans depend on
+        its timing, so those never count as the same.
+        """
+        if self.game.search_budget is not None or self.pooled:
+            return None
+        return (self.game.level_map.hash, target_pos, self.pos, self.defend_mode)
+
+    def search_budget(self):
+        """Cells the attack searches may still expand this tick, None without a cap"""
+        if self.game.search_budget is None:
+            return None
+        return max(self.game.search_budget - self.searched, 1)
+
+    def move(self, grid, player_pos):
+        current_time = self.game.clock()
+        self.searched = 0
+        if current_time - self.last_move_time <= move_interval:
+            return
+
+        if self.lookahead is not None:
+            self.move_ahead(grid)
+            self.last_move_time = current_time
+            return
+
+        idle = self.idle_key(player_pos)
+        if not self.next_moves and idle is not None and idle == self.idle:
+            return  # The searches would find nothing to do again
+            
+        if not self.next_moves or self.are_circles_nearby(grid):
+            self.next_moves = self.compute_next_moves(grid, player_pos)
+        
+        if not self.next_moves or self.are_circles_nearby(grid):
+            self.next_moves = self.compute_next_moves(grid, player_pos)
+    
+        if not self.next_moves:  # If still no moves, just return
+            self.idle = idle
+            return
+        
+        x, y = self.pos
+        
+        new_x, new_y = self.next_moves.pop()
+        
+        # Check if the new position is valid (i.e., not a wall or a circle)
+        if grid[new_y][new_x] == WALL or grid[new_y][new_x] == CIRCLE:
+            # Recompute the path if the next move is not valid
+            self.next_moves = self.compute_next_moves(grid, player_pos)
+            if not self.next_moves:
+                return
+            new_x, new_y = self.next_moves.pop()
+            if self.pooled and (grid[new_y][new_x] == WALL or grid[new_y][new_x] == CIRCLE):
+                # Still the old plan, which a pooled NPC follows until its new one arrives
+                self.next_moves = []
+                return
+        
+        # Only update the grid and position if the enemy actually moves
+        if (new_x, new_y) != (x, y):
+            if not self.walk(grid, new_x, new_y):
+                return
+            
+            # If no moves left, prepare to put a circle (bomb) or switch modes
+            if not self.next_moves:
+                if self.defend_mode:
+                    self.switch_mode(False)
+                else:
+                    self.put_circle(self.game.circles, grid)
+                    self.switch_mode(True)
+                self.next_moves = self.compute_next_moves(grid, player_pos)
+                
+            self.last_move_time = current_time
+            
+    def walk(self, grid, new_x, new_y):
+        """Steps onto a neighbouring cell; returns False if it was on fire, which ends the NPC"""
+        x, y = self.pos
+        level_map = self.game.level_map
+
+        # Clear the current position on the grid if it's not a player or circle
+        if grid[y][x] != self.other:
+            level_map.put(x, y, 0) #if grid[y][x] != CIRCLE else CIRCLE
+
+            if (x, y) in self.game.circles:
+                level_map.put(x, y, CIRCLE)
+
+        # If the new position is fire, the enemy loses
+        if grid[new_y][new_x] == FIRE:
+            self.game.kill(self, "walked into the fire", (new_x, new_y))
+            return False
+
+        # Move the enemy to the new position on the grid
+        if grid[new_y][new_x] != self.other:
+            level_map.put(new_x, new_y, self.value)
+
+        # Update the enemy's position
+        self.pos = (new_x, new_y)
+        return True
+
+    def move_ahead(self, grid):
+        """Takes the step the lookahead search picks, against the entity this NPC hunts"""
+        target = self.game.player if self.other == PLAYER else self.game.enemy
+        started = time.perf_counter()
+        with self.game.profiler.phase('lookahead'):
+            (new_x, new_y), bomb = self.lookahead.decide(self, target)
+        self.game.planning_time += time.perf_counter() - started
+        if bomb:
+            self.put_circle(self.game.circles, grid)
+        elif (new_x, new_y) != self.pos:
+            self.walk(grid, new_x, new_y)
+
+    def switch_mode(self, defend):
+        if defend != self.defend_mode:
+            self.defend_mode = defend
+            x, y = self.pos
+            self.game.events.emit(MODE_SWITCH, x, y, (self.icon, defend))
+
+    def are_circles_nearby(self, grid):
+        # The alert map covers every cell within 4 of a bomb, stopping at walls
+        if self.game.level_map.alert.is_dangerous(self.pos):
+            self.switch_mode(True)
+            return True
+
+        # If no bombs were found in any direction, return False
+        return False
+            
+class Map:
+    def __init__(self, SIZE, percentage, rng=random, backend="list", buffers=None, out=None):
+        forbidden = [(0,0), (0,1), (1,0), (SIZE-1, SIZE-1), (SIZE-2, SIZE-1), (SIZE-1, SIZE-2), (0, SIZE-1), (0, SIZE-2), (1, SIZE-1)]
+        spawns = [(0, 0), (SIZE-1, SIZE-1)]
+
+        # Seeded walls, with the spawns guaranteed to reach each other
+        walls = mapgen.generate(SIZE, percentage, rng, forbidden=forbidden, spawns=spawns)
+        if backend == "numpy":
+            grid = npgrid.from_bytes(walls, SIZE, out)  # Same values in an int8 array, out's if given
+        else:
+            grid = [list(walls[y * SIZE:(y + 1) * SIZE]) for y in range(SIZE)]
+        
+        grid[0][0] = PLAYER  # represents the player
+        grid[SIZE-1][SIZE-1] = ENEMY  # represents the enemy
+        self.grid = grid
+
+        # Zobrist hash of the cells the path searches tell apart (see pathcache.py),
+        # kept up to date by set() and put(), which every write to the grid goes through.
+        # Only the walls and the enemy's spawn count at first (the player's value isn't hashed)
+        self.hash = walls_hash(walls) ^ cell_key(SIZE * SIZE - 1, HASHED[ENEMY])
+
+        # Flat walls (1) and open cells (0), y*SIZE+x, kept up to date like the hash,
+        # and a count of the changes to them, for state that depends on the walls
+        self.walls = walls
+        self.wall_version = 0
+
+        # Callbacks told the flat index (y*SIZE+x) of every cell that may have
+        # become passable or blocked for the NPC searches
+        self.watchers = []
+
+        # Blast coverage of the bombs on the board, for the NPC searches (radius 2)
+        # and for noticing bombs nearby (radius 4)
+        self.danger = DangerMap(grid, radius=2, on_change=self.cell_changed)
+        self.alert = DangerMap(grid, radius=4)
+
+        # Escape field shared by every NPC in defend mode, rebuilt at most once per tick
+        self.escape = None
+
+        # Pursuit fields shared by the NPCs of a crowd, by target, rebuilt at most once per tick
+        self.pursuit = {}
+
+        # Search state reused by every search on this map instead of allocated for
+        # each one, by what it is for; made on first use. A game passes the same
+        # dict to the map of every round
+        self.buffers = buffers if buffers is not None else {}
+
+    def watch(self, callback):
+        self.watchers.append(callback)
+
+    def cell_changed(self, index):
+        self.pursuit.clear()
+        for callback in self.watchers:
+            callback(index)
+
+    def set(self, x, y, value):
+        """Writes a cell that can block paths (bombs, fire, walls), telling the watchers"""
+        grid = self.grid
+        old = grid[y][x]
+        grid[y][x] = value
+        index = y * len(grid[0]) + x
+        self.rehash(index, old, value)
+        if (old == WALL) != (value == WALL):
+            self.wall_changed(index, value)
+        if (old in BLOCKING) != (value in BLOCKING):
+            self.cell_changed(index)
+
+    def put(self, x, y, value):
+        """Writes a cell entities step on or off, which the watchers aren't told about"""
+        grid = self.grid
+        old = grid[y][x]
+        grid[y][x] = value
+        if old != value:
+            index = y * len(grid[0]) + x
+            self.rehash(index, old, value)
+            if old == WALL or value == WALL:
+                self.wall_changed(index, value)
+
+    def wall_changed(self, index, value):
+        self.walls[index] = value == WALL
+        self.wall_version += 1
+
+    def rehash(self, index, old, value):
+        slot = HASHED.get(old)
+        if slot is not None:
+            self.hash ^= cell_key(index, slot)
+        slot = HASHED.get(value)
+        if slot is not None:
+            self.hash ^= cell_key(index, slot)
+
+    def add_bomb(self, pos):
+        self.danger.add_bomb(pos)
+        self.alert.add_bomb(pos)
+        self.escape = None
+
+    def remove_bomb(self, pos):
+        self.danger.remove_bomb(pos)
+        self.alert.remove_bomb(pos)
+        self.escape = None
+
+    def remove_wall(self, pos):
+        self.danger.wall_removed(pos)
+        self.alert.wall_removed(pos)
+        self.escape = None
+
+    def buffers_for(self, key):
+        """The SearchBuffers kept for key ('attack', 'defend', 'escape', ('pursuit', n)), made the first time it is asked for"""
+        buffers = self.buffers.get(key)
+        if buffers is None:
+            buffers = self.buffers[key] = SearchBuffers(len(self.grid) * len(self.grid[0]))
+        return buffers
+
+    def escape_path(self, pos, stats=None, unsafe=None):
+        """Escape from pos; unsafe (see escape_field) keeps the field to the cells around bombs and fire"""
+        if self.escape is None:
+            self.escape = escape_field(self.grid, self.danger, stats, unsafe, self.buffers_for('escape'))
+        return escape_path(self.escape, pos, len(self.grid[0]))
+
+    def pursuit_path(self, pos, target, stats=None, hunters=None):
+        """Path from pos to target, out of the pursuit field every NPC hunting target shares"""
+        field = self.pursuit.get(target)
+        if field is None:
+            # Each target of this tick searches in its own buffers, so its field stays readable
+            buffers = self.buffers_for(('pursuit', len(self.pursuit)))
+            field = self.pursuit[target] = pursuit_field(self.grid, target, self.danger, stats, hunters, buffers)
+        return pursuit_path(field, pos, len(self.grid[0]))
+
+    def draw(self, renderer, header="", overlay=(), view=None):
+        renderer.draw(self.grid, header, overlay, view)
+
+
+class SimClock:
+    """A clock that only moves when told to, for running games faster than real time"""
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, dt):
+        self.now += dt
+
+
+class Game:
+    """All the state of one game: the map, the player, the NPCs, bombs and fire.
+
+    clock returns the current time in seconds. The terminal game uses time.time;
+    headless games use a SimClock and move it forward with step(dt), so they run
+    as fast as the simulation allows. Nothing here reads the keyboard or draws.
+    on_game_over(winner, message) is called when a round ends, before the reset.
+    Rounds longer than max_ticks end in a 'draw'. Pass a profiler.Profiler to time
+    each phase of a tick and count the nodes every search expands. backend="numpy"
+    keeps the grid in a numpy int8 array (see npgrid.py). search_budget caps the
+    cells one NPC search may expand, so that on a big map a far or unreachable
+    target can't stall a tick; the NPC then heads for the closest cell found.
+    npc_count NPCs hunt the player. With more than one (a crowd) they spread over
+    the map, share one pursuit field per tick, and an NPC caught by fire leaves
+    the board; the player wins when the last one does. inputs, an
+    inputs.InputQueue, carries key presses from other threads; each step applies
+    the ones queued since the last, so only the thread calling step touches the game.
+    With humans=2 a second Player takes the blue side instead of the NPCs.
+    planning, a workers.PlanningPool for maps of this size, plans the NPCs' attack
+    paths in other processes, so a slow search can't hold up the tick. lookahead,
+    a lookahead.Lookahead, picks every step of the blue NPCs instead of the paths.
+    board, a size x size int8 array such as one game's slice of a batch, holds the
+    grid of every round with the numpy backend, instead of an array per round.
+    events, an events.EventBus, gets the bombs, explosions, fire, NPC mode switches,
+    deaths and round ends as they happen and hands them to its subscribers at the
+    end of each tick.
+    """
+
+    def __init__(self, size=SIZE, percentage=PERCENTAGE, seed=None, clock=None, ai_player=False, on_game_over=None, max_ticks=None, profiler=None, backend="list", search_budget=None, npc_count=1, inputs=None, humans=1, planning=None, lookahead=None, board=None, events=None):
+        self.size = size
+        self.percentage = percentage
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.clock = clock if clock is not None else SimClock()
+        self.ai_player = ai_player
+        self.on_game_over = on_game_over
+        self.max_ticks = max_ticks
+        self.backend = backend
+        self.search_budget = search_budget
+        self.npc_count = npc_count
+        self.crowd = npc_count > 1
+        self.inputs = inputs
+        self.humans = humans
+        if planning is not None and planning.size != size:
+            raise ValueError(f"the planning pool is for {planning.size}x{planning.size} maps, not {size}x{size}")
+        self.planning = planning
+        self.lookahead = lookahead
+        if board is not None and backend != "numpy":
+            raise ValueError("only the numpy backend keeps its grid in a given board")
+        self.board = board
+        self.events = events if events is not None else EventBus()
+        self.profiler = profiler if profiler is not None else NullProfiler()
+        self.search_stats = {'expanded': 0}
+        self.search_buffers = {}  # The maps' SearchBuffers, kept from round to round
+        self.path_cache = PathCache()  # attack_astar and defend_astar results, keyed by the map's grid hash
+
+        self.player_score = 0
+        self.enemy_score = 0
+        self.rounds = 0
+        self.reset()
+
+    def reset(self):
+        if self.planning is not None:
+            self.planning.forget()  # Plans for the old board
+        self.level_map = Map(self.size, percentage=self.percentage, rng=self.rng, backend=self.backend, buffers=self.search_buffers,
+                             out=self.board)
+        if self.ai_player:
+            # An NPC plays the red side, hunting the blue NPC
+            self.player = Enemy(self, icon="🔴", pos=(0, 0), value=PLAYER)
+        else:
+            self.player = Player(self)
+
+        if self.humans == 2:
+            self.enemy = Player(self, number=2)
+            self.npcs = []
+        else:
+            self.enemy = Enemy(self)
+            #enemy2 = Enemy(self, "🤢", pos=(0, self.size-1))
+            self.npcs = [self.enemy]
+        if self.crowd:
+            self.spawn_crowd()
+
+        self.circles = BombRegistry()
+        self.fire = Fire(self.size, self.size)
+
+        self.winner = None
+        self.message = None
+        self.ticks = 0
+        self.bombs_placed = 0
+        self.planning_time = 0.0
+
+        for npc in self.npcs:
+            npc.compute_next_moves(self.level_map.grid, self.player.pos)
+
+    def spawn_crowd(self):
+        """Puts the NPCs beyond the first on random empty cells the player can walk to"""
+        level_map = self.level_map
+        grid = level_map.grid
+        field = pursuit_field(grid, self.player.pos, level_map.danger, buffers=level_map.buffers_for('attack'))
+        cells = []
+        for index in field.reached():
+            y, x = divmod(index, self.size)
+            if field.distance[index] >= CROWD_SPAWN_DISTANCE and grid[y][x] == 0:
+                cells.append((x, y))
+        for x, y in self.rng.sample(cells, min(self.npc_count - 1, len(cells))):
+            level_map.put(x, y, ENEMY)
+            self.npcs.append(Enemy(self, pos=(x, y)))
+
+    def handle_key(self, key):
+        """Applies a key press: w/s/a/d move the player and f drops a bomb; i/k/j/l and ç do the same for player 2"""
+        if self.ai_player or self.winner is not None:
+            return  # Keys pressed after the round ended are dropped
+        player = self.player
+        grid = self.level_map.grid
+        if key in player.directions:
+            player.move_player(key, grid, self.enemy.pos)
+        elif key == "f":
+            player.put_circle(self.circles, grid)
+        elif self.humans == 2:
+            if key in self.enemy.directions:
+                self.enemy.move_player(key, grid, player.pos)
+            elif key == "ç":
+                self.enemy.put_circle(self.circles, grid)
+
+    def kill(self, entity, cause, pos=None):
+        """entity was caught by fire at pos (where it stands by default): an NPC of a crowd leaves the board, anyone else loses the round"""
+        message = f"Game Over! {entity.icon} {cause}."
+        x, y = pos if pos is not None else entity.pos
+        self.events.emit(DEATH, x, y, (entity.icon, message))
+        if entity is self.player:
+            self.game_over('enemy', message)
+        elif entity in self.npcs:
+            self.kill_npc(entity, message)
+        else:
+            self.game_over('player', message)  # Player 2
+
+    def kill_npc(self, npc, message=None):
+        """Takes npc off the board; the player wins when it was the last NPC"""
+        if len(self.npcs) == 1:
+            self.game_over('player', message)
+            return
+        self.npcs.remove(npc)
+        if npc is self.enemy:
+            self.enemy = self.npcs[0]
+
+    def game_over(self, winner, message=None):
+        """Ends the round; the board is reset at the end of the current step"""
+        if self.winner is None:
+            self.winner = winner
+            self.message = message
+
+    def entity_cells(self):
+        """Flat indices of the cells the player and the NPCs stand on"""
+        for entity in [self.player] + self.npcs:
+            x, y = entity.pos
+            yield y * self.size + x
+
+    def unsafe_cells(self):
+        """Flat indices of the cells that may be unsafe other than bomb blasts: fire and everyone's cell"""
+        yield from self.fire.burning()
+        yield from self.entity_cells()
+
+    def scoreboard(self):
+        return f"Scoreboard: Player {self.player_score} - {self.enemy_score} Enemy"
+
+    def step(self, dt=None):
+        """Advances the game by one tick, moving a SimClock forward by dt first
+
+        Returns the winner if the round ended during this tick, otherwise None.
+        """
+        if dt is not None:
+            self.clock.advance(dt)
+        self.ticks += 1
+        tick = self.ticks  # finish_round starts the count again
+        grid = self.level_map.grid
+
+        profiler = self.profiler
+
+        self.level_map.escape = None  # The board moved on since the last tick
+        self.level_map.pursuit.clear()
+        if self.inputs is not None:
+            with profiler.phase('inputs'):
+                events = self.inputs.drain()
+                for _, key, _ in events:
+                    self.handle_key(key)
+                self.inputs.mark_applied(events)
+
+        with profiler.phase('detonate_circles'):
+            Circle.detonate_circles(self)
+
+        if self.ai_player and self.winner is None:
+            with profiler.phase('npc.move'):
+                self.player.move(grid, self.enemy.pos)
+        for npc in list(self.npcs):
+            if self.winner is not None:
+                break
+            with profiler.phase('npc.move'):
+                npc.move(grid, self.player.pos)
+
+        if self.winner is None:
+            with profiler.phase('update_explosions'):
+                Circle.update_explosions(self)
+
+        if self.winner is None and self.max_ticks is not None and self.ticks >= self.max_ticks:
+            self.game_over('draw', "Draw! Nobody was hit in time.")
+
+        winner = self.finish_round() if self.winner is not None else None
+        self.events.flush(tick)
+        return winner
+
+    def finish_round(self):
+        winner = self.winner
+        if winner == 'player':
+            self.player_score += 1
+        elif winner == 'enemy':
+            self.enemy_score += 1
+        self.rounds += 1
+
+        self.events.emit(ROUND_OVER, detail=(winner, self.message))
+        if self.on_game_over is not None:
+            self.on_game_over(winner, self.message)
+        self.reset()
+        return winner
+
+
+def main():
+    """Plays a few NPC-vs-NPC rounds headless as fast as possible"""
+    game = Game(seed=0, ai_player=True, max_ticks=30 * 60)
+    started = time.perf_counter()
+    ticks = 0
+    while game.rounds < 20:
+        game.step(1/30)
+        ticks += 1
+    elapsed = time.perf_counter() - started
+
+    print(game.scoreboard(), f"({game.rounds - game.player_score - game.enemy_score} draws)")
+    print(f"{ticks} ticks ({ticks / 30:.0f}s of game time) in {elapsed:.2f}s, {ticks / elapsed:.0f} ticks per second")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+import time
+import random
+import itertools
+import threading
+from collections import deque
+from profiler import Histogram
+from scheduler import FixedStepLoop
+
+
+class InputQueue:
+    """Key presses handed from the keyboard thread to the game tick.
+
+    push() can be called from any thread: it only appends to a deque, which is
+    atomic in CPython, so the keyboard thread never takes a lock and never touches
+    the game. The tick drains the queue once and applies the events in order, and
+    the frame drawn after that calls rendered(). How long each key took from the
+    press to the tick that applied it, and to the frame that showed it, goes into
+    two histograms (seconds).
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.events = deque()
+        self.sequence = itertools.count()
+
+        self.applied = 0
+        self.out_of_order = 0  # Events applied with a sequence number other than the next one
+        self.last_sequence = -1
+        self.unrendered = []   # Press times of the events applied since the last frame
+        self.to_applied = Histogram()
+        self.to_rendered = Histogram()
+
+    def __len__(self):
+        return len(self.events)
+
+    def push(self, key):
+        """Queues a key press, timestamped now"""
+        self.events.append((next(self.sequence), key, self.clock()))
+
+    def drain(self):
+        """Removes and returns the events queued so far, oldest first"""
+        events = self.events
+        return [events.popleft() for _ in range(len(events))]
+
+    def mark_applied(self, events):
+        now = self.clock()
+        for sequence, _, pressed_at in events:
+            if sequence != self.last_sequence + 1:
+                self.out_of_order += 1
+            self.last_sequence = sequence
+            self.to_applied.record(now - pressed_at)
+            self.unrendered.append(pressed_at)
+        self.applied += len(events)
+
+    def rendered(self):
+        """Records the press-to-screen latency of the events applied since the last frame"""
+        now = self.clock()
+        for pressed_at in self.unrendered:
+            self.to_rendered.record(now - pressed_at)
+        self.unrendered.clear()
+
+    def report(self):
+        applied, rendered = self.to_applied.summary(), self.to_rendered.summary()
+        return (f"{self.applied} inputs, key to tick p50 {applied['p50'] * 1000:.1f}ms p99 {applied['p99'] * 1000:.1f}ms, "
+                f"key to screen p50 {rendered['p50'] * 1000:.1f}ms p99 {rendered['p99'] * 1000:.1f}ms")
+
+
+def produce(queue, rate, duration, seed, done):
+    """Pushes random game keys at rate events per second for duration seconds, from the calling thread"""
+    rng = random.Random(seed)
+    keys = 'wasdf'
+    started = time.perf_counter()
+    pushed = 0
+    while True:
+        elapsed = time.perf_counter() - started
+        if elapsed >= duration:
+            break
+        due = int(elapsed * rate)
+        while pushed < due:
+            queue.push(rng.choice(keys))
+            pushed += 1
+        time.sleep(0.0005)
+    done.append(pushed)
+
+
+def stress(rate, duration=2.0, seed=0):
+    """Hammers a headless game with rate key presses per second from another thread
+
+    Returns (pushed, queue, consistent): every pushed event has to come out of the
+    queue once and in order, and the game state has to hold together afterwards.
+    """
+    from game import Game
+    from danger import DangerMap
+
+    queue = InputQueue()
+    game = Game(seed=seed, inputs=queue)
+    loop = FixedStepLoop(game.step, queue.rendered, tick_rate=30, render_rate=30)
+
+    done = []
+    producer = threading.Thread(target=produce, args=(queue, rate, duration, seed, done))
+    producer.start()
+    loop.resync()
+    while producer.is_alive():
+        wait = loop.run_once()
+        if wait > 0:
+            time.sleep(wait)
+    producer.join()
+    game.step(loop.tick_dt)  # Whatever was pushed after the last tick
+    queue.rendered()
+
+    # A race between the threads would show up as a danger map out of step with the bombs
+    danger = DangerMap(game.level_map.grid)
+    for circle in game.circles:
+        danger.add_bomb(circle.pos)
+    consistent = danger.counts == game.level_map.danger.counts
+    return done[0], queue, consistent
+
+
+def main():
+    for rate in (100, 1000, 5000, 20000):
+        pushed, queue, consistent = stress(rate)
+        lost = pushed - queue.applied
+        print(f"{rate:>6}/s: {pushed} pushed, {lost} lost, {queue.out_of_order} out of order, "
+              f"state {'consistent' if consistent else 'INCONSISTENT'}")
+        print(f"         {queue.report()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,448 @@
+import math
+import time
+import random
+from game import FUSE, move_interval
+
+# The search runs on NPC steps: one step is one NPC move, and the target is assumed
+# to move at the same pace. Bombs and fire are timed in steps too.
+STEP = move_interval
+FUSE_STEPS = math.ceil(FUSE / STEP)
+RADIUS = 2
+WINDOW = 16  # Steps covered by the timers in a hash; above the longest fuse
+
+BUDGET_MS = 5.0
+MAX_DEPTH = 12
+MAX_ENTRIES = 200_000  # The table is cleared when it grows past this
+
+MOVES = ((0, 0), (1, 0), (-1, 0), (0, 1), (0, -1))
+BOMB = len(MOVES)  # Action that drops a bomb and stays
+
+# Bomb owners
+NPC, TARGET, OTHER = 0, 1, 2
+
+WIN = 10_000
+EXACT, LOWER, UPPER = 0, 1, 2
+
+# A table entry is one int, (((value + WIN * 2) * 32 + depth) * 4 + flag) * 8 + action:
+# a dict of ints holds nothing the garbage collector has to walk
+OFFSET = WIN * 2
+
+
+def pack(depth, value, flag, action):
+    return (((value + OFFSET) * 32 + depth) * 4 + flag) * 8 + action
+
+
+def unpack(entry):
+    """(depth, value, flag, action) of a table entry"""
+    rest, action = divmod(entry, 8)
+    rest, flag = divmod(rest, 4)
+    value, depth = divmod(rest, 32)
+    return depth, value - OFFSET, flag, action
+
+# Evaluation weights
+DISTANCE = 2   # Per step between the NPC and the target
+FAR = WIN // (4 * DISTANCE)  # Steps beyond which the distance stops counting, keeping values well inside +-WIN
+THREAT = 40    # Target in a blast, divided by the steps left on its fuse
+DANGER = 100   # NPC in a blast, likewise
+TRAPPED = 500  # Target (or NPC, negated) in a blast it can't walk out of in time
+MOBILITY = 3   # Per cell the target can step to
+
+
+class OutOfTime(Exception):
+    pass
+
+
+class Zobrist:
+    """Random 64-bit keys for the features of a state, made the first time each is asked for
+
+    A feature is a kind (entity position, bomb, fire, broken wall, step, bombs in
+    hand) with a cell, a timer modulo WINDOW and an owner, packed into one int.
+    """
+
+    def __init__(self, seed=0x5EED):
+        self.rng = random.Random(seed)
+        self.keys = {}
+
+    def __call__(self, kind, index=0, timer=0, owner=0):
+        code = ((index * WINDOW + timer % WINDOW) * 4 + owner) * 8 + kind
+        key = self.keys.get(code)
+        if key is None:
+            key = self.keys[code] = self.rng.getrandbits(64)
+        return key
+
+
+# Feature kinds
+K_NPC, K_TARGET, K_BROKEN, K_FIRE, K_BOMB, K_STEP, K_HAND = range(7)
+
+
+class State:
+    """One point of the lookahead: positions, bombs, fire and destroyed walls.
+
+    Cells are flat indices y*size+x. bombs maps a cell to (step it explodes at,
+    owner), fire a cell to the step it stops burning, broken holds the walls
+    blown up since the root. Children share these dicts with their parent and
+    only copy the one they change, so most steps copy nothing but the slots.
+    """
+
+    __slots__ = ('npc', 'target', 'npc_bombs', 'target_bombs', 'bombs', 'fire', 'broken', 'step', 'hash')
+
+    def clone(self):
+        child = State.__new__(State)
+        child.npc = self.npc
+        child.target = self.target
+        child.npc_bombs = self.npc_bombs
+        child.target_bombs = self.target_bombs
+        child.bombs = self.bombs
+        child.fire = self.fire
+        child.broken = self.broken
+        child.step = self.step
+        child.hash = self.hash
+        return child
+
+
+class Lookahead:
+    """Picks an NPC's next step by searching bomb timers and target moves ahead.
+
+    Each decision is a depth-first alpha-beta search, deepened one step at a time
+    until budget_ms runs out; the step taken is the best one of the deepest search
+    that finished, so a bigger budget plays better and never takes longer. At each
+    step the NPC moves or drops a bomb, then the target answers with its worst move
+    for the NPC, then the bombs and fire move on a step. States are hashed with
+    Zobrist keys into a transposition table that orders the moves of each deeper
+    search and is kept from one decision to the next while the walls stay the same.
+    """
+
+    def __init__(self, budget_ms=BUDGET_MS, max_depth=MAX_DEPTH):
+        self.budget = budget_ms / 1000
+        self.max_depth = max_depth
+        self.zobrist = Zobrist()
+        self.table = {}
+        self.walls = None        # The map's flat walls, read in place
+        self.walls_of = None     # (map, wall version) the table's states were hashed against
+
+        self.decisions = 0
+        self.nodes = 0
+        self.depths = 0  # Sum of the depths of the searches that finished
+        self.deadline = 0.0
+
+    def root(self, game, npc, target):
+        """The state of the board as the search sees it"""
+        size = game.size
+        z = self.zobrist
+        now = game.clock()
+        base = int(now / STEP)
+        state = State()
+        state.npc = npc.pos[1] * size + npc.pos[0]
+        state.target = target.pos[1] * size + target.pos[0]
+        state.npc_bombs = npc.available_circles
+        state.target_bombs = target.available_circles
+        state.step = base
+        state.broken = {}
+
+        state.bombs = {}
+        for circle in game.circles:
+            x, y = circle.pos
+            steps = 1 if circle.timestamp == 0 else max(1, math.ceil((circle.timestamp + FUSE - now) / STEP))
+            owner = NPC if circle.owner is npc else TARGET if circle.owner is target else OTHER
+            state.bombs[y * size + x] = (base + steps, owner)
+
+        state.fire = {}
+        for expiry, _, cells in game.fire.expiries:
+            ends = base + max(1, math.ceil((expiry - now) / STEP))
+            for y, x in cells:
+                index = y * size + x
+                state.fire[index] = max(state.fire.get(index, 0), ends)
+
+        h = z(K_NPC, state.npc) ^ z(K_TARGET, state.target) ^ z(K_STEP, timer=base)
+        h ^= z(K_HAND, timer=state.npc_bombs, owner=NPC) ^ z(K_HAND, timer=state.target_bombs, owner=TARGET)
+        for index, (explodes, owner) in state.bombs.items():
+            h ^= z(K_BOMB, index, explodes, owner)
+        for index, ends in state.fire.items():
+            h ^= z(K_FIRE, index, ends)
+        state.hash = h
+        return state
+
+    def decide(self, npc, target):
+        """The cell npc should step to next and whether it should drop a bomb there first"""
+        game = npc.game
+        started = time.perf_counter()
+        self.deadline = started + self.budget
+        self.decisions += 1
+
+        level_map = game.level_map
+        walls_of = (level_map, level_map.wall_version)
+        if walls_of != self.walls_of or len(self.table) > MAX_ENTRIES:
+            self.table.clear()  # Its states were hashed against the old walls
+            self.walls_of = walls_of
+        self.walls = level_map.walls
+        self.size = game.size
+        state = self.root(game, npc, target)
+
+        best = 0  # Stay, if not even the first search finishes
+        try:
+            for depth in range(1, self.max_depth + 1):
+                value, action = self.search(state, depth, -math.inf, math.inf)
+                best = action
+                self.depths += 1
+                if abs(value) >= WIN - self.max_depth:
+                    break  # Won or lost whatever comes after
+        except OutOfTime:
+            pass
+
+        if best == BOMB:
+            return npc.pos, True
+        dx, dy = MOVES[best]
+        return (npc.pos[0] + dx, npc.pos[1] + dy), False
+
+    def actions(self, state, who):
+        """Actions open to the NPC (who=NPC) or the target: moves to free cells, staying, and a bomb"""
+        size = self.size
+        walls = self.walls
+        bombs = state.bombs
+        fire = state.fire
+        broken = state.broken
+        index = state.npc if who == NPC else state.target
+        y, x = divmod(index, size)
+        actions = [0]
+        for action in range(1, BOMB):
+            dx, dy = MOVES[action]
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < size and 0 <= ny < size:
+                cell = ny * size + nx
+                if (not walls[cell] or cell in broken) and cell not in bombs and cell not in fire:
+                    actions.append(action)
+        hand = state.npc_bombs if who == NPC else state.target_bombs
+        if hand > 0 and index not in bombs:
+            actions.append(BOMB)
+        return actions
+
+    def act(self, state, who, action):
+        """state after the NPC or the target took action"""
+        z = self.zobrist
+        child = state.clone()
+        if who == NPC:
+            index, kind = state.npc, K_NPC
+        else:
+            index, kind = state.target, K_TARGET
+        if action == BOMB:
+            bombs = child.bombs = dict(state.bombs)
+            bombs[index] = (state.step + FUSE_STEPS, who)
+            child.hash ^= z(K_BOMB, index, state.step + FUSE_STEPS, who)
+            if who == NPC:
+                child.hash ^= z(K_HAND, timer=child.npc_bombs, owner=NPC) ^ z(K_HAND, timer=child.npc_bombs - 1, owner=NPC)
+                child.npc_bombs -= 1
+            else:
+                child.hash ^= z(K_HAND, timer=child.target_bombs, owner=TARGET) ^ z(K_HAND, timer=child.target_bombs - 1, owner=TARGET)
+                child.target_bombs -= 1
+        elif action:
+            dx, dy = MOVES[action]
+            moved = index + dy * self.size + dx
+            child.hash ^= z(kind, index) ^ z(kind, moved)
+            if who == NPC:
+                child.npc = moved
+            else:
+                child.target = moved
+        return child
+
+    def blast(self, state, index):
+        """Cells a bomb at index reaches, stopping at (and taking) walls and other bombs"""
+        size = self.size
+        walls = self.walls
+        broken = state.broken
+        bombs = state.bombs
+        y, x = divmod(index, size)
+        cells = [index]
+        for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+            for i in range(1, RADIUS + 1):
+                nx, ny = x + dx * i, y + dy * i
+                if not (0 <= nx < size and 0 <= ny < size):
+                    break
+                cell = ny * size + nx
+                cells.append(cell)
+                if (walls[cell] and cell not in broken) or cell in bombs:
+                    break
+        return cells
+
+    def advance(self, state):
+        """Moves state on a step in place: bombs that are due go off, fire burns out
+
+        Returns WIN if the target ends up in fire (the game checks the target
+        first), -WIN if only the NPC does, 0 otherwise.
+        """
+        z = self.zobrist
+        h = state.hash ^ z(K_STEP, timer=state.step)
+        state.step += 1
+        step = state.step
+        h ^= z(K_STEP, timer=step)
+
+        fire = state.fire
+        if fire and min(fire.values()) <= step:
+            fire = {index: ends for index, ends in fire.items() if ends > step}
+            for index, ends in state.fire.items():
+                if ends <= step:
+                    h ^= z(K_FIRE, index, ends)
+        due = [index for index, (explodes, _) in state.bombs.items() if explodes <= step]
+        if due:
+            bombs = dict(state.bombs)
+            broken = state.broken
+            if fire is state.fire:
+                fire = dict(fire)
+            ends = step + 2  # Fire lasts Fire.duration, two steps
+            while due:
+                index = due.pop()
+                if index not in bombs:
+                    continue
+                cells = self.blast(state, index)
+                explodes, owner = bombs.pop(index)
+                h ^= z(K_BOMB, index, explodes, owner)
+                if owner == NPC:
+                    h ^= z(K_HAND, timer=state.npc_bombs, owner=NPC) ^ z(K_HAND, timer=state.npc_bombs + 1, owner=NPC)
+                    state.npc_bombs += 1
+                elif owner == TARGET:
+                    h ^= z(K_HAND, timer=state.target_bombs, owner=TARGET) ^ z(K_HAND, timer=state.target_bombs + 1, owner=TARGET)
+                    state.target_bombs += 1
+                for cell in cells:
+                    if cell in bombs:
+                        due.append(cell)  # Chain reaction, in the same step
+                    elif self.walls[cell] and cell not in broken:
+                        if broken is state.broken:
+                            broken = dict(broken)
+                        broken[cell] = True
+                        h ^= z(K_BROKEN, cell)
+                    old = fire.get(cell)
+                    if old is not None:
+                        h ^= z(K_FIRE, cell, old)
+                    fire[cell] = ends
+                    h ^= z(K_FIRE, cell, ends)
+                state.bombs = bombs  # blast() of the chained bombs sees these gone
+                state.broken = broken
+        state.fire = fire
+        state.hash = h
+
+        if state.target in fire:
+            return WIN
+        if state.npc in fire:
+            return -WIN
+        return 0
+
+    def search(self, state, depth, alpha, beta):
+        """(value, best NPC action) of state searched depth steps ahead, for the NPC"""
+        self.nodes += 1
+        if time.perf_counter() > self.deadline:
+            raise OutOfTime
+
+        entry = self.table.get(state.hash)
+        first = None
+        if entry is not None:
+            stored_depth, value, flag, first = unpack(entry)
+            if stored_depth >= depth and (flag == EXACT or (flag == LOWER and value >= beta) or (flag == UPPER and value <= alpha)):
+                return value, first
+        if depth == 0:
+            return self.evaluate(state), 0
+
+        actions = self.actions(state, NPC)
+        if first in actions:
+            actions.remove(first)
+            actions.insert(0, first)
+
+        start_alpha = alpha
+        best, best_action = -math.inf, actions[0]
+        for action in actions:
+            moved = self.act(state, NPC, action)
+            # The target's answer is the worst one for the NPC
+            value = math.inf
+            floor = beta
+            for reply in self.actions(moved, TARGET):
+                child = self.act(moved, TARGET, reply)
+                outcome = self.advance(child)
+                if outcome:
+                    # Sooner wins count more, later losses less
+                    result = outcome + (depth if outcome > 0 else -depth)
+                else:
+                    result = self.search(child, depth - 1, alpha, floor)[0]
+                if result < value:
+                    value = result
+                    if value <= alpha:
+                        break  # The NPC has a better action already
+                    if value < floor:
+                        floor = value
+            if value > best:
+                best, best_action = value, action
+                if best > alpha:
+                    alpha = best
+                    if alpha >= beta:
+                        break
+
+        flag = UPPER if best <= start_alpha else LOWER if best >= beta else EXACT
+        self.table[state.hash] = pack(depth, best, flag, best_action)
+        return best, best_action
+
+    def coverage(self, state):
+        """Cell -> steps until the first blast reaches it, for the cells some bomb's blast reaches"""
+        covered = {}
+        step = state.step
+        for index, (explodes, _) in state.bombs.items():
+            fuse = explodes - step
+            for cell in self.blast(state, index):
+                if covered.get(cell, WINDOW) > fuse:
+                    covered[cell] = fuse
+        return covered
+
+    def escapes(self, state, start, covered):
+        """Whether an entity at start can reach a cell no blast covers before its own cell's blast"""
+        size = self.size
+        walls = self.walls
+        broken = state.broken
+        bombs = state.bombs
+        fire = state.fire
+        limit = covered[start]
+        frontier = [start]
+        seen = {start}
+        for steps in range(1, limit):
+            reached = []
+            for index in frontier:
+                y, x = divmod(index, size)
+                for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+                    nx, ny = x + dx, y + dy
+                    if not (0 <= nx < size and 0 <= ny < size):
+                        continue
+                    cell = ny * size + nx
+                    if cell in seen or (walls[cell] and cell not in broken) or cell in bombs or cell in fire:
+                        continue
+                    if covered.get(cell, WINDOW) <= steps:
+                        continue  # Blown up by the time it gets there
+                    if cell not in covered:
+                        return True
+                    seen.add(cell)
+                    reached.append(cell)
+            frontier = reached
+        return False
+
+    def evaluate(self, state):
+        """Heuristic value of a state for the NPC, from distance, blasts and the target's room to move"""
+        size = self.size
+        npc_y, npc_x = divmod(state.npc, size)
+        target_y, target_x = divmod(state.target, size)
+        score = -DISTANCE * min(abs(npc_x - target_x) + abs(npc_y - target_y), FAR)
+
+        if state.bombs:
+            covered = self.coverage(state)
+            fuse = covered.get(state.target)
+            if fuse is not None:
+                score += THREAT // max(fuse, 1)
+                if not self.escapes(state, state.target, covered):
+                    score += TRAPPED
+            fuse = covered.get(state.npc)
+            if fuse is not None:
+                score -= DANGER // max(fuse, 1)
+                if not self.escapes(state, state.npc, covered):
+                    score -= TRAPPED
+
+        moves = sum(1 for action in self.actions(state, TARGET) if 0 < action < BOMB)
+        score -= MOBILITY * moves
+        return score
+
+    def report(self):
+        decisions = max(self.decisions, 1)
+        return (f"{self.decisions} decisions, {self.nodes / decisions:.0f} nodes and depth "
+                f"{self.depths / decisions:.1f} per decision, {len(self.table)} table entries")
@@ -0,0 +1,213 @@
+import re
+import time
+import random
+from bisect import bisect_right
+
+try:
+    import numpy as np
+except ImportError:  # numpy only makes the connectivity check faster
+    np = None
+
+OPEN_RUN = re.compile(rb'\x00+')
+
+
+def sample_walls(size, percentage, forbidden, rng):
+    """Flat bytearray (y*size+x) with walls (1) on percentage% of the cells outside forbidden
+
+    Every cell draws one random byte and the bytes are mapped to wall/open in one
+    pass, so there is no rejection sampling over the whole grid. The handful of
+    cells needed to hit the exact wall count is then added or removed at random.
+    """
+    cells = size * size
+    target = int((cells - len(forbidden)) * percentage / 100)
+
+    threshold = round(percentage * 256 / 100)
+    table = bytes(1 if b < threshold else 0 for b in range(256))
+    grid = bytearray(rng.randbytes(cells).translate(table))
+
+    forbidden_indices = {y * size + x for x, y in forbidden}
+    for index in forbidden_indices:
+        grid[index] = 0
+
+    walls = grid.count(1)
+    while walls < target:
+        index = rng.randrange(cells)
+        if not grid[index] and index not in forbidden_indices:
+            grid[index] = 1
+            walls += 1
+    while walls > target:
+        index = rng.randrange(cells)
+        if grid[index]:
+            grid[index] = 0
+            walls -= 1
+    return grid
+
+
+class Components:
+    """Union-find over the open cells of a flat grid, built on horizontal runs of open cells.
+
+    Each run is one element, runs touching the run above are unioned, and
+    component(x, y) finds the root for an open cell. Walls opened later are
+    joined in as elements of their own by carve().
+    """
+
+    def __init__(self, grid, size):
+        self.size = size
+        self.parent = []
+        self.row_starts = []
+        self.row_ends = []
+        self.row_ids = []
+        self.labels = None
+        self.carved = {}
+
+        if np is not None:
+            self.label_with_numpy(grid)
+        else:
+            self.label_runs(grid)
+
+    def find(self, node):
+        parent = self.parent
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    def union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a != b:
+            self.parent[max(a, b)] = min(a, b)
+
+    def label_runs(self, grid):
+        size = self.size
+        previous = []
+        for y in range(size):
+            row = bytes(grid[y * size:(y + 1) * size])
+            runs = [(match.start(), match.end(), len(self.parent) + i) for i, match in enumerate(OPEN_RUN.finditer(row))]
+            self.parent.extend(run_id for _, _, run_id in runs)
+
+            # Union with every run of the row above that overlaps
+            i = j = 0
+            while i < len(previous) and j < len(runs):
+                above_start, above_end, above_id = previous[i]
+                start, end, run_id = runs[j]
+                if above_start < end and start < above_end:
+                    self.union(above_id, run_id)
+                if above_end < end:
+                    i += 1
+                else:
+                    j += 1
+
+            self.row_starts.append([start for start, _, _ in runs])
+            self.row_ends.append([end for _, end, _ in runs])
+            self.row_ids.append([run_id for _, _, run_id in runs])
+            previous = runs
+
+    def label_with_numpy(self, grid):
+        """Same union-find, with runs, their vertical contacts and the unions done on whole arrays"""
+        size = self.size
+        open_cells = np.frombuffer(bytes(grid), dtype=np.uint8).reshape(size, size) == 0
+
+        starts = open_cells.copy()
+        starts[:, 1:] &= ~open_cells[:, :-1]
+        run_ids = np.cumsum(starts.reshape(-1)) - 1
+
+        # Runs touching vertically; neighbouring contacts between the same two runs are kept once
+        touching = np.flatnonzero((open_cells[:-1] & open_cells[1:]).reshape(-1))
+        above, below = run_ids[touching], run_ids[touching + size]
+        first = np.ones(len(above), dtype=bool)
+        first[1:] = (above[1:] != above[:-1]) | (below[1:] != below[:-1])
+        above, below = above[first], below[first]
+
+        # Hook every root onto the smallest root it touches, then compress paths by
+        # pointer jumping, until no pair of touching runs has different roots
+        parent = np.arange(int(starts.sum()))
+        while True:
+            root_above, root_below = parent[above], parent[below]
+            split = root_above != root_below
+            if not split.any():
+                break
+            np.minimum.at(parent, np.maximum(root_above, root_below)[split], np.minimum(root_above, root_below)[split])
+            while True:
+                grandparent = parent[parent]
+                if (grandparent == parent).all():
+                    break
+                parent = grandparent
+
+        self.parent = parent.tolist()
+        self.labels = np.where(open_cells.reshape(-1), run_ids, -1)
+
+    def component(self, x, y):
+        """Root of the open cell (x, y), or None for a wall"""
+        node = self.carved.get((x, y))
+        if node is not None:
+            return self.find(node)
+
+        if self.labels is not None:
+            label = int(self.labels[y * self.size + x])
+            return None if label < 0 else self.find(label)
+
+        i = bisect_right(self.row_starts[y], x) - 1
+        if i < 0 or x >= self.row_ends[y][i]:
+            return None
+        return self.find(self.row_ids[y][i])
+
+    def carve(self, x, y, grid):
+        """Opens the wall at (x, y) and unions it with its open neighbours; returns its root"""
+        size = self.size
+        grid[y * size + x] = 0
+        node = len(self.parent)
+        self.parent.append(node)
+        for nx, ny in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+            if 0 <= nx < size and 0 <= ny < size and not grid[ny * size + nx]:
+                self.union(node, self.component(nx, ny))
+        self.carved[(x, y)] = node
+        return self.find(node)
+
+
+def connect(grid, size, spawns, rng):
+    """Carves walls along random monotone walks until every spawn shares a component with the first
+
+    Returns the number of walls carved.
+    """
+    components = Components(grid, size)
+    carved = 0
+    start = spawns[0]
+    for goal in spawns[1:]:
+        x, y = start
+        while components.component(*start) != components.component(*goal):
+            # Step toward the goal, picking between the two useful directions at random
+            dx = (goal[0] > x) - (goal[0] < x)
+            dy = (goal[1] > y) - (goal[1] < y)
+            if dx and (not dy or rng.random() < 0.5):
+                x += dx
+            else:
+                y += dy
+            if grid[y * size + x]:
+                components.carve(x, y, grid)
+                carved += 1
+    return carved
+
+
+def generate(size, percentage, rng=random, forbidden=(), spawns=()):
+    """Returns a seeded size x size flat bytearray of walls (1) and open cells (0)
+
+    Walls cover percentage% of the cells outside forbidden, then just enough of them
+    are carved away that every spawn can reach the first one. The same rng state
+    always gives the same map, with or without numpy.
+    """
+    grid = sample_walls(size, percentage, forbidden, rng)
+    if len(spawns) > 1:
+        connect(grid, size, list(spawns), rng)
+    return grid
+
+
+def main():
+    for size in (10, 100, 500, 2000):
+        started = time.perf_counter()
+        grid = generate(size, 70, random.Random(size), forbidden=[(0, 0), (size-1, size-1)], spawns=[(0, 0), (size-1, size-1)])
+        elapsed = time.perf_counter() - started
+        print(f"{size}x{size}: {grid.count(1) / len(grid):.1%} walls in {elapsed * 1000:.0f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+# Optional NumPy backend: a grid can also be a 2-D numpy int8 array holding the
+# same values as the list of lists. These helpers work on whole arrays at once;
+# without numpy installed only the list grids are available.
+try:
+    import numpy as np
+except ImportError:  # numpy is optional
+    np = None
+
+DIRECTIONS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+
+
+def is_array(grid):
+    return np is not None and isinstance(grid, np.ndarray)
+
+
+def to_array(grid):
+    """Copies a list-of-lists grid into an int8 array"""
+    if np is None:
+        raise RuntimeError("the numpy grid backend needs numpy installed")
+    return np.array(grid, dtype=np.int8)
+
+
+def from_bytes(cells, size, out=None):
+    """int8 array grid from a flat bytes-like grid of size*size cells, written into out if given"""
+    if np is None:
+        raise RuntimeError("the numpy grid backend needs numpy installed")
+    grid = np.frombuffer(bytes(cells), dtype=np.int8).reshape(size, size)
+    if out is None:
+        return grid.copy()
+    out[...] = grid
+    return out
+
+
+def flat_cells(grid):
+    """The cells of an array grid as a flat memoryview indexed by y*width+x, or None for a list grid
+
+    Indexing the memoryview gives plain ints and is much cheaper than indexing the
+    array one element at a time. It shares the array's memory, so it is only valid
+    while the grid isn't written to.
+    """
+    if not is_array(grid):
+        return None
+    return memoryview(np.ascontiguousarray(grid, dtype=np.int8).reshape(-1))
+
+
+def find_bombs(grid):
+    """(x, y) of every bomb (value 2) on an array grid"""
+    ys, xs = np.nonzero(grid == 2)
+    return list(zip(xs.tolist(), ys.tolist()))
+
+
+def shift(mask, dx, dy):
+    """mask moved by (dx, dy), with cells pushed off the edge dropped"""
+    out = np.zeros_like(mask)
+    height, width = mask.shape
+    out[max(dy, 0):height + min(dy, 0), max(dx, 0):width + min(dx, 0)] = \
+        mask[max(-dy, 0):height + min(-dy, 0), max(-dx, 0):width + min(-dx, 0)]
+    return out
+
+
+def blast_counts(grid, radius=2):
+    """For every cell, how many bomb blasts reach it; blasts stop at (and include) walls
+
+    The same counts as DangerMap.from_grid, computed with radius shifted masks per direction.
+    """
+    bombs = grid == 2
+    open_cells = grid != 1
+    counts = bombs.astype(np.int32)
+    for dx, dy in DIRECTIONS:
+        front = bombs
+        for i in range(radius):
+            front = shift(front, dx, dy)
+            counts += front
+            front = front & open_cells  # A wall takes the blast
+    return counts
+
+
+def safe_cells(grid, danger_counts):
+    """Flat indices of the cells that are empty or hold the player (0 or -1) and no blast reaches"""
+    open_cells = ((grid == 0) | (grid == -1)).reshape(-1)
+    return np.flatnonzero(open_cells & (np.asarray(danger_counts) == 0)).tolist()
+
+
+def danger_mask(grid, radius=2):
+    """Cells any bomb blast would reach"""
+    return blast_counts(grid, radius) > 0
+
+
+def simulate_explosions(grid, radius=2):
+    """Array version of defend.simulate_explosions: every cell a blast reaches, except walls, becomes fire (3)"""
+    out = grid.copy()
+    out[danger_mask(grid, radius) & (grid != 1)] = 3
+    return out
@@ -0,0 +1,100 @@
+from functools import lru_cache
+from collections import OrderedDict
+from npgrid import np
+
+# Cell values the searches tell apart, and their slot among a cell's hash keys:
+# walls, bombs and fire block or endanger paths, and an NPC's cell (-2) is never a
+# safe spot for defend_astar. Empty cells and the player (-1) count the same to
+# both searches and aren't hashed.
+HASHED = {1: 0, 2: 1, 3: 2, -2: 3}
+
+CAPACITY = 256  # Path results kept
+
+MISSING = object()  # What PathCache.get returns for a key it doesn't hold
+
+MASK = (1 << 64) - 1
+
+KEYS_KEPT = 1 << 16  # Keys of the cells written most recently, which explosions and entities keep writing
+
+
+@lru_cache(maxsize=KEYS_KEPT)
+def cell_key(index, slot):
+    """The 64-bit key of value slot at flat cell index: splitmix64 of index*4 + slot
+
+    Keys are derived when needed instead of stored, so a map of any size costs
+    no memory and no time up front for them.
+    """
+    z = ((index * 4 + slot + 1) * 0x9E3779B97F4A7C15) & MASK
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK
+    return z ^ (z >> 31)
+
+
+def walls_hash(walls):
+    """The hash of a flat grid of 0 and 1 (WALL) cells, such as mapgen makes"""
+    if np is not None:
+        # The same splitmix64, on every wall at once; uint64 products wrap like & MASK
+        z = (np.flatnonzero(np.frombuffer(bytes(walls), dtype=np.uint8)).astype(np.uint64) * np.uint64(4)
+             + np.uint64(HASHED[1] + 1)) * np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return int(np.bitwise_xor.reduce(z ^ (z >> np.uint64(31)), initial=np.uint64(0)))
+    h = 0
+    index = walls.find(1)
+    while index >= 0:
+        h ^= cell_key(index, HASHED[1])
+        index = walls.find(1, index + 1)
+    return h
+
+
+def grid_hash(grid):
+    """The hash of a whole grid, from scratch; Map keeps its own up to date as cells change"""
+    h = 0
+    width = len(grid[0])
+    for y, row in enumerate(grid):
+        for x, cell in enumerate(row):
+            slot = HASHED.get(int(cell))
+            if slot is not None:
+                h ^= cell_key(y * width + x, slot)
+    return h
+
+
+class PathCache:
+    """Search results by (grid hash, start, goal, mode, budget), dropping the least recently used.
+
+    The searches only depend on what the grid hash covers and on the rest of
+    the key, so while nothing but the player moves, an NPC asking for the same
+    search again gets the path it was given before. Paths are shared between
+    hits and must not be changed.
+    """
+
+    def __init__(self, capacity=CAPACITY):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """The result stored for key, or MISSING"""
+        result = self.entries.get(key, MISSING)
+        if result is MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return result
+
+    def put(self, key, result):
+        self.entries[key] = result
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def report(self):
+        lookups = max(self.hits + self.misses, 1)
+        return (f"path cache: {self.hits} hits, {self.misses} misses ({self.hits / lookups:.0%} hit rate), "
+                f"{self.evictions} evictions, {len(self.entries)}/{self.capacity} entries")
@@ -0,0 +1,242 @@
+import heapq
+from npgrid import flat_cells
+
+INF = float("inf")
+
+
+class AttackPlanner:
+    """Incremental path search from an NPC to a moving target (Moving Target D* Lite).
+
+    The search tree is rooted at the NPC and kept between calls. When the target
+    moves, only the keys are corrected (km); when the NPC steps along its path, the
+    part of the tree that no longer hangs below its new cell is dropped and repaired
+    from the cells around it; when cells become blocked or free (reported through
+    cell_changed) only the costs into those cells are updated. Each plan() then
+    expands roughly as many cells as the change touched instead of a whole search.
+
+    Cells are passable the same way as for attack_astar: no wall, bomb or fire,
+    and no blast of the danger map reaching them. Unlike attack_astar, which uses
+    a squared-distance heuristic, the paths are always shortest.
+    """
+
+    def __init__(self, grid, danger):
+        self.grid = grid
+        self.danger_counts = danger.counts
+        self.width = len(grid[0])
+        self.height = len(grid)
+        self.cells = flat_cells(grid)  # Flat view of a numpy grid, None for lists
+
+        self.start = None
+        self.goal = None
+        self.changed = set()  # Cells whose passability changed since the last plan
+
+    def __getstate__(self):
+        # The flat view can't be copied; a copy makes its own over its copy of the grid
+        state = self.__dict__.copy()
+        del state['cells']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.cells = flat_cells(self.grid)
+
+    def reset(self, start, goal):
+        """Forgets the previous search and roots a new one at start"""
+        self.start = start
+        self.goal = goal
+        self.km = 0
+        self.g = {}
+        self.rhs = {start: 0}
+        self.parent = {}
+        self.open_keys = {}
+        self.open_heap = []
+        self.changed.clear()
+        self.push(start)
+
+    def cell_changed(self, index):
+        """Notes that the cell y*width+x may have become passable or blocked"""
+        self.changed.add(index)
+
+    def passable(self, index):
+        width = self.width
+        cell = self.grid[index // width][index % width] if self.cells is None else self.cells[index]
+        return not (cell == 1 or cell == 2 or cell == 3 or self.danger_counts[index])
+
+    def neighbours(self, index):
+        width = self.width
+        y, x = divmod(index, width)
+        if x + 1 < width:
+            yield index + 1
+        if x > 0:
+            yield index - 1
+        if y + 1 < self.height:
+            yield index + width
+        if y > 0:
+            yield index - width
+
+    def key(self, index):
+        value = min(self.g.get(index, INF), self.rhs.get(index, INF))
+        y, x = divmod(index, self.width)
+        goal_y, goal_x = divmod(self.goal, self.width)
+        return (value + abs(x - goal_x) + abs(y - goal_y) + self.km, value)
+
+    def push(self, index):
+        key = self.key(index)
+        self.open_keys[index] = key
+        heapq.heappush(self.open_heap, (key[0], key[1], index))
+
+    def top(self):
+        """The open cell with the lowest key and its key, skipping stale heap entries"""
+        heap = self.open_heap
+        open_keys = self.open_keys
+        while heap:
+            k1, k2, index = heap[0]
+            if open_keys.get(index) == (k1, k2):
+                return index, (k1, k2)
+            heapq.heappop(heap)
+        return None, (INF, INF)
+
+    def update_state(self, index):
+        """Puts an inconsistent cell in the open set and takes a consistent one out"""
+        if self.g.get(index, INF) != self.rhs.get(index, INF):
+            self.push(index)
+        else:
+            self.open_keys.pop(index, None)
+
+    def set_rhs(self, index, value, parent):
+        if value == INF:
+            self.rhs.pop(index, None)
+            self.parent.pop(index, None)
+        else:
+            self.rhs[index] = value
+            self.parent[index] = parent
+
+    def update_rhs(self, index):
+        """Recomputes the cheapest way into index from its neighbours"""
+        best, best_parent = INF, None
+        if self.passable(index):
+            g = self.g
+            for neighbour in self.neighbours(index):
+                value = g.get(neighbour, INF) + 1
+                if value < best:
+                    best, best_parent = value, neighbour
+        self.set_rhs(index, best, best_parent)
+
+    def move_start(self, start, max_deleted=None):
+        """Re-roots the tree at start, which must be a child of the old start in it
+
+        The cells left out of the subtree of the new start lose their values and get
+        them back from their neighbours (optimized deletion), so the cost follows the
+        part of the tree left behind. Returns False when start isn't usable as a new
+        root, or more than max_deleted cells would go, and the search has to be reset
+        instead.
+        """
+        old_start = self.start
+        g, rhs, parent = self.g, self.rhs, self.parent
+        if parent.get(start) != old_start or g.get(start, INF) != rhs.get(start, INF):
+            return False
+
+        # Walk down the tree from the old start, leaving out the branch below the
+        # new start; that branch keeps its values, everything walked is deleted
+        deleted = [old_start]
+        for node in deleted:
+            for neighbour in self.neighbours(node):
+                if neighbour != start and parent.get(neighbour) == node:
+                    deleted.append(neighbour)
+            if max_deleted is not None and len(deleted) > max_deleted:
+                return False
+
+        del parent[start]  # Its value stays, so the kept subtree doesn't need updating
+        self.start = start
+        for index in deleted:
+            g.pop(index, None)
+            self.set_rhs(index, INF, None)
+            self.open_keys.pop(index, None)
+        for index in deleted:
+            self.update_rhs(index)
+            if index in rhs:
+                self.push(index)
+        return True
+
+    def compute(self, max_expanded=None):
+        """Expands cells until the goal is consistent, or max_expanded cells were
+
+        Returns how many cells were expanded and whether the goal is settled; an
+        unfinished search carries on where it stopped on the next call.
+        """
+        g, rhs, parent = self.g, self.rhs, self.parent
+        start, goal = self.start, self.goal
+        expanded = 0
+        while True:
+            index, key = self.top()
+            if not (key < self.key(goal) or rhs.get(goal, INF) > g.get(goal, INF)):
+                return expanded, True
+            if expanded == max_expanded:
+                return expanded, False
+            new_key = self.key(index)
+            if key < new_key:
+                self.push(index)
+                continue
+            expanded += 1
+            del self.open_keys[index]
+
+            value = rhs.get(index, INF)
+            if g.get(index, INF) > value:
+                # Overconsistent: settle it and offer it to its neighbours
+                g[index] = value
+                for neighbour in self.neighbours(index):
+                    if neighbour != start and rhs.get(neighbour, INF) > value + 1 and self.passable(neighbour):
+                        self.set_rhs(neighbour, value + 1, index)
+                        self.update_state(neighbour)
+            else:
+                # Underconsistent: its value went up, so its children look elsewhere
+                g.pop(index, None)
+                self.update_state(index)
+                for neighbour in self.neighbours(index):
+                    if neighbour != start and parent.get(neighbour) == index:
+                        self.update_rhs(neighbour)
+                        self.update_state(neighbour)
+
+    def plan(self, start, goal, stats=None, max_expanded=None):
+        """Returns a shortest path from start to goal as (x, y) tuples, or None if goal can't be reached
+
+        If stats is a dict, the number of cells expanded by this repair is stored in
+        stats['expanded']. With max_expanded, a repair that needs more cells than
+        that returns None for now and continues on the next call.
+        """
+        width = self.width
+        start_index = start[1] * width + start[0]
+        goal_index = goal[1] * width + goal[0]
+
+        if self.start is None:
+            self.reset(start_index, goal_index)
+        if goal_index != self.goal:
+            old_y, old_x = divmod(self.goal, width)
+            self.km += abs(goal[0] - old_x) + abs(goal[1] - old_y)
+            self.goal = goal_index
+        if start_index != self.start and not self.move_start(start_index, max_expanded):
+            self.reset(start_index, goal_index)
+
+        for index in self.changed:
+            if index != self.start:
+                self.update_rhs(index)
+                self.update_state(index)
+        self.changed.clear()
+
+        expanded, settled = self.compute(max_expanded)
+        if stats is not None:
+            stats['expanded'] = expanded
+        if not settled or goal_index not in self.rhs:
+            return None
+
+        # Follow the parents back from the goal
+        path = []
+        index = goal_index
+        while index != start_index:
+            y, x = divmod(index, width)
+            path.append((x, y))
+            index = self.parent.get(index)
+            if index is None or len(path) > len(self.rhs):
+                return None
+        path.append(start)
+        return path[::-1]
@@ -0,0 +1,132 @@
+import json
+import math
+import time
+
+
+class Histogram:
+    """Log-scale histogram: eight buckets per power of two, so ~6% resolution at any magnitude"""
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, value):
+        mantissa, exponent = math.frexp(value)  # value = mantissa * 2**exponent, 0.5 <= mantissa < 1
+        bucket = exponent * 8 + int((mantissa - 0.5) * 16)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    @staticmethod
+    def upper_bound(bucket):
+        exponent, step = divmod(bucket, 8)
+        return (0.5 + (step + 1) / 16) * 2 ** exponent
+
+    def percentile(self, p):
+        """Upper bound of the bucket holding the p-th percentile (0-100)"""
+        if not self.count:
+            return 0.0
+        rank = self.count * p / 100
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(self.upper_bound(bucket), self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'max': self.max,
+        }
+
+
+class Phase:
+    """Context manager timing one named phase into its histogram; reused, so timing allocates nothing"""
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.started = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.record(time.perf_counter() - self.started)
+
+
+class Profiler:
+    """Collects per-phase timings (seconds) and per-search counts (e.g. nodes expanded) as histograms"""
+
+    def __init__(self):
+        self.timings = {}
+        self.counts = {}
+        self.phases = {}
+
+    def phase(self, name):
+        phase = self.phases.get(name)
+        if phase is None:
+            histogram = self.timings[name] = Histogram()
+            phase = self.phases[name] = Phase(histogram)
+        return phase
+
+    def count(self, name, value):
+        histogram = self.counts.get(name)
+        if histogram is None:
+            histogram = self.counts[name] = Histogram()
+        histogram.record(value)
+
+    def summary(self):
+        return {
+            'timings': {name: histogram.summary() for name, histogram in self.timings.items()},
+            'counts': {name: histogram.summary() for name, histogram in self.counts.items()},
+        }
+
+    def dump(self, path):
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def overlay(self):
+        """Lines for the on-screen overlay: phase times in microseconds, then the counters"""
+        lines = [f"{'phase':<20} {'p50us':>8} {'p99us':>8} {'maxus':>8} {'n':>7}"]
+        for name, histogram in self.timings.items():
+            lines.append(f"{name:<20} {histogram.percentile(50) * 1e6:>8.0f} {histogram.percentile(99) * 1e6:>8.0f} {histogram.max * 1e6:>8.0f} {histogram.count:>7}")
+        for name, histogram in self.counts.items():
+            lines.append(f"{name:<20} {histogram.percentile(50):>8.0f} {histogram.percentile(99):>8.0f} {histogram.max:>8.0f} {histogram.count:>7}")
+        return lines
+
+
+class NullPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+class NullProfiler:
+    """Stands in for Profiler when profiling is off"""
+
+    null_phase = NullPhase()
+
+    def phase(self, name):
+        return self.null_phase
+
+    def count(self, name, value):
+        pass
+
+    def overlay(self):
+        return []
@@ -0,0 +1,136 @@
+import sys
+import shutil
+
+# Emoji drawn for each grid value, anything else is an empty cell
+CELL_ICONS = {1: "⬛", -1: "🔴", -2: "🔵", 2: "💣", 3: "🔥"}
+EMPTY_ICON = "⬜"
+
+
+class Camera:
+    """The window of a big grid that is on screen, following a position.
+
+    The window only scrolls when the followed position gets within margin cells
+    of its edge, so walking around mostly leaves the screen where it is.
+    """
+
+    def __init__(self, width, height, margin=None):
+        self.width = width
+        self.height = height
+        self.margin = margin
+        self.left = 0
+        self.top = 0
+
+    def fit_terminal(self, reserved_lines=2):
+        """Resizes the view to the terminal, minus reserved_lines for the header and overlay"""
+        columns, lines = shutil.get_terminal_size()
+        self.resize(max(columns // 2, 1), max(lines - reserved_lines, 1))
+
+    def resize(self, width, height):
+        self.width = width
+        self.height = height
+
+    def follow(self, pos, grid_width, grid_height):
+        """Scrolls to keep pos in view and returns the view as (left, top, width, height)"""
+        width = min(self.width, grid_width)
+        height = min(self.height, grid_height)
+        x, y = pos
+        self.left = self.scroll(self.left, x, width, grid_width)
+        self.top = self.scroll(self.top, y, height, grid_height)
+        return (self.left, self.top, width, height)
+
+    def scroll(self, start, pos, size, total):
+        margin = self.margin if self.margin is not None else size // 4
+        margin = min(margin, (size - 1) // 2)
+        if pos < start + margin:
+            start = pos - margin
+        elif pos > start + size - 1 - margin:
+            start = pos - size + 1 + margin
+        return max(0, min(start, total - size))
+
+
+class Renderer:
+    """Draws the grid on the terminal by diffing against the previous frame.
+
+    Only the cells that changed are written, each behind an ANSI cursor move,
+    and the whole frame goes out in a single write. Emojis are two columns wide.
+    A view (left, top, width, height) draws just that window of a bigger grid,
+    so the cost of a frame follows the size of the window and not of the map.
+    """
+
+    def __init__(self, out=None):
+        self.out = out or sys.stdout
+        self.previous = None
+        self.header = None
+        self.overlay = []
+        self.icons = {}
+
+        self.frames = 0
+        self.bytes_written = 0  # Bytes sent for the last frame
+        self.total_bytes = 0
+
+    def icon(self, value):
+        icon = self.icons.get(value)
+        if icon is None:
+            icon = self.icons[value] = CELL_ICONS.get(value, EMPTY_ICON)
+        return icon
+
+    def invalidate(self):
+        """Forces the next frame to redraw everything, e.g. after something else printed over the board"""
+        self.previous = None
+        self.header = None
+        self.overlay = []
+
+    def draw(self, grid, header="", overlay=(), view=None):
+        """Draws header on the first line, the grid (or its view) under it and the overlay lines under that"""
+        if view is not None:
+            left, top, width, height = view
+            grid = [row[left:left + width] for row in grid[top:top + height]]
+
+        parts = []
+        previous = self.previous
+        if previous is None or len(previous) != len(grid) or len(previous[0]) != len(grid[0]):
+            parts.append("\033[?25l\033[2J")  # Hide the cursor and clear the screen
+            previous = None
+
+        if header != self.header:
+            parts.append(f"\033[1;1H{header}\033[K")
+            self.header = header
+
+        icon = self.icon
+        for y, row in enumerate(grid):
+            previous_row = previous[y] if previous is not None else None
+            last_x = -2
+            for x, cell in enumerate(row):
+                if previous_row is not None and previous_row[x] == cell:
+                    continue
+                # Consecutive changed cells don't need another cursor move
+                if x != last_x + 1:
+                    parts.append(f"\033[{y + 2};{2 * x + 1}H")
+                parts.append(icon(cell))
+                last_x = x
+
+        # Only the overlay lines that changed are rewritten, and leftover ones cleared
+        top = len(grid) + 2
+        overlay = list(overlay)
+        for i in range(max(len(overlay), len(self.overlay))):
+            line = overlay[i] if i < len(overlay) else ""
+            if previous is None or i >= len(self.overlay) or self.overlay[i] != line:
+                parts.append(f"\033[{top + i};1H{line}\033[K")
+        self.overlay = overlay
+
+        # Park the cursor under the board so stray output doesn't land on it
+        parts.append(f"\033[{top + len(overlay)};1H")
+
+        frame = "".join(parts)
+        self.out.write(frame)
+        self.out.flush()
+
+        self.previous = [list(row) for row in grid]
+        self.frames += 1
+        self.bytes_written = len(frame.encode())
+        self.total_bytes += self.bytes_written
+
+    def close(self):
+        """Shows the cursor again"""
+        self.out.write("\033[?25h")
+        self.out.flush()
@@ -0,0 +1,288 @@
+import sys
+import copy
+import mmap
+import time
+import random
+import struct
+import argparse
+from game import Game, SimClock
+from events import EventBus
+from inputs import InputQueue
+from scheduler import FixedStepLoop
+
+# A game is fully determined by its parameters, its seed, the fixed tick length and
+# the keys applied at each tick, so that is all a replay file holds.
+#
+# Header: magic, version, seed, size, wall percentage, npc count, humans, ai player,
+# backend (0 list, 1 numpy), search budget and max ticks (0 for none), tick length
+# in seconds, then the ticks and scores at the end of the recording (0 until the
+# recording is closed). Then one record per applied key: ticks since the previous
+# record and the key's index in KEYS.
+MAGIC = b"BMRP"
+VERSION = 1
+HEADER = struct.Struct("<4sBQIBIBBBIIdIHH")
+RECORD = struct.Struct("<HB")
+KEYS = "wsadfikjlç"
+NO_KEY = 255  # Record that only carries a gap longer than a record can hold
+BACKENDS = ("list", "numpy")
+
+SNAPSHOT_EVERY = 300  # Ticks between the snapshots seek() restarts from
+
+
+class Recorder:
+    """Writes the keys a game applies to a replay file.
+
+    It takes the place of game.inputs and passes the key presses of the queue it
+    replaced through, so it sees exactly the keys each tick applied. The game needs
+    a seed, or the map couldn't be made again, and neither a planning pool nor a
+    lookahead, whose moves depend on how fast the machine was. Use it in a with
+    block, or close() it, to finish the file.
+    """
+
+    def __init__(self, path, game, tick_dt):
+        if game.seed is None:
+            raise ValueError("only a game with a seed can be replayed")
+        if game.planning is not None or game.lookahead is not None:
+            raise ValueError("a game planned by a worker pool or a timed lookahead doesn't replay the same way")
+        self.game = game
+        self.tick_dt = tick_dt
+
+        self.tick = 0
+        self.last_event = 0
+        self.events = 0
+        self.file = open(path, "wb")
+        try:
+            self.write_header()
+        except BaseException:
+            self.file.close()
+            raise
+
+        self.queue = game.inputs
+        game.inputs = self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write_header(self):
+        game = self.game
+        self.file.write(HEADER.pack(
+            MAGIC, VERSION, game.seed, game.size, game.percentage, game.npc_count, game.humans,
+            game.ai_player, BACKENDS.index(game.backend), game.search_budget or 0, game.max_ticks or 0,
+            self.tick_dt, self.tick, game.player_score, game.enemy_score))
+
+    def drain(self):
+        self.tick += 1  # The game drains once per tick
+        events = self.queue.drain() if self.queue is not None else []
+        for _, key, _ in events:
+            self.write(key)
+        return events
+
+    def mark_applied(self, events):
+        if self.queue is not None:
+            self.queue.mark_applied(events)
+
+    def write(self, key):
+        code = KEYS.find(key)
+        if code < 0:
+            return  # Not a game key, handle_key ignores it
+        gap = self.tick - self.last_event
+        while gap > 0xFFFF:
+            self.file.write(RECORD.pack(0xFFFF, NO_KEY))
+            gap -= 0xFFFF
+        self.file.write(RECORD.pack(gap, code))
+        self.last_event = self.tick
+        self.events += 1
+
+    def close(self):
+        """Writes the final ticks and scores into the header, which marks the recording complete"""
+        with self.file:
+            self.file.seek(0)
+            self.write_header()
+
+
+class ReplayInputs:
+    """Stands in for the InputQueue of a replayed game, handing it the recorded keys of each tick"""
+
+    def __init__(self):
+        self.pending = []
+
+    def drain(self):
+        events, self.pending = self.pending, []
+        return events
+
+    def mark_applied(self, events):
+        pass
+
+
+class Replay:
+    """Plays a replay file back by running the game again with the recorded keys.
+
+    The file is memory-mapped and its records are decoded as the ticks reach them.
+    Every snapshot_every ticks a copy of the game is kept, so seek() to any tick
+    only has to run forward from the closest snapshot before it.
+    """
+
+    def __init__(self, path, snapshot_every=SNAPSHOT_EVERY):
+        with open(path, "rb") as file:
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, seed, size, percentage, npc_count, humans, ai_player, backend,
+         search_budget, max_ticks, self.tick_dt, self.ticks, player_score, enemy_score) = HEADER.unpack_from(self.data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} replay")
+        self.params = dict(size=size, percentage=percentage, seed=seed, ai_player=bool(ai_player),
+                           max_ticks=max_ticks or None, backend=BACKENDS[backend],
+                           search_budget=search_budget or None, npc_count=npc_count, humans=humans)
+        self.scores = (player_score, enemy_score)
+        self.complete = self.ticks > 0  # An interrupted recording never got its final header
+
+        # A recording cut off mid-record ends at the last whole one
+        self.end = HEADER.size + (len(self.data) - HEADER.size) // RECORD.size * RECORD.size
+        self.events = (self.end - HEADER.size) // RECORD.size
+        if not self.complete:
+            self.ticks = sum(gap for gap, _ in struct.iter_unpack(RECORD.format, self.data[HEADER.size:self.end]))
+
+        self.inputs = ReplayInputs()
+        self.bus = EventBus()  # The replayed game's events, kept across seeks
+        self.snapshot_every = snapshot_every
+        self.snapshots = {}
+        self.restart()
+
+    def restart(self):
+        self.game = Game(clock=SimClock(), inputs=self.inputs, events=self.bus, **self.params)
+        self.tick = 0
+        self.offset = HEADER.size  # Next record to read
+        self.last_event = 0        # Tick of the last record read
+        self.snapshot()
+
+    def snapshot(self):
+        # The copy shares the inputs and the event bus, which hold nothing between ticks
+        game = copy.deepcopy(self.game, {id(self.inputs): self.inputs, id(self.bus): self.bus})
+        self.snapshots[self.tick] = (game, self.offset, self.last_event)
+
+    def restore(self, tick):
+        game, self.offset, self.last_event = self.snapshots[tick]
+        self.game = copy.deepcopy(game, {id(self.inputs): self.inputs, id(self.bus): self.bus})
+        self.tick = tick
+
+    def keys_at(self, tick):
+        """The recorded keys of tick, which has to be the tick after the last one read"""
+        keys = []
+        data = self.data
+        while self.offset < self.end:
+            gap, code = RECORD.unpack_from(data, self.offset)
+            if self.last_event + gap != tick:
+                break
+            self.offset += RECORD.size
+            self.last_event = tick
+            if code != NO_KEY:
+                keys.append(KEYS[code])
+        return keys
+
+    def finished(self):
+        return self.tick >= self.ticks
+
+    def step(self, dt=None):
+        """Runs the next recorded tick; dt is only there to fit FixedStepLoop"""
+        self.tick += 1
+        self.inputs.pending = [(0, key, 0.0) for key in self.keys_at(self.tick)]
+        self.game.step(self.tick_dt)
+        if self.tick % self.snapshot_every == 0 and self.tick not in self.snapshots:
+            self.snapshot()
+
+    def seek(self, tick):
+        """Brings the game to the state it had after tick"""
+        tick = max(0, min(tick, self.ticks))
+        start = max(t for t in self.snapshots if t <= tick)
+        if start > self.tick or self.tick > tick:
+            self.restore(start)
+        while self.tick < tick:
+            self.step()
+
+    def run(self):
+        """Runs the rest of the recording as fast as possible"""
+        while not self.finished():
+            self.step()
+
+    def play(self, render, speed=1.0):
+        """Runs the rest of the recording at speed times the recorded pace, calling render() for each frame"""
+        def update(dt):
+            self.step()
+            if self.finished():
+                loop.stop()
+
+        loop = FixedStepLoop(update, render, tick_rate=speed / self.tick_dt, render_rate=min(speed / self.tick_dt, 30))
+        if not self.finished():
+            loop.run()
+        render()
+
+    def matches_recording(self):
+        """Whether a finished replay ended with the scores the recording did"""
+        game = self.game
+        return not self.complete or (game.player_score, game.enemy_score) == self.scores
+
+
+def record_random(path, ticks, seed=0, keys_per_second=4.0, tick_dt=1/30, **params):
+    """Records a headless game driven by random key presses, e.g. for a performance corpus"""
+    rng = random.Random(seed)
+    queue = InputQueue()
+    game = Game(seed=seed, inputs=queue, **params)
+    chance = keys_per_second * tick_dt
+    with Recorder(path, game, tick_dt):
+        for _ in range(ticks):
+            if rng.random() < chance:
+                queue.push(rng.choice("wasdf"))
+            game.step(tick_dt)
+    return game
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play back a recorded game")
+    parser.add_argument("path")
+    parser.add_argument("--realtime", action="store_true", help="draw the game in the terminal at the recorded pace")
+    parser.add_argument("--speed", type=float, default=1.0, help="pace multiplier for --realtime")
+    parser.add_argument("--seek", type=int, help="jump to this tick first")
+    parser.add_argument("--make", type=int, metavar="TICKS", help="record a game of random key presses of this many ticks to path instead")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the game --make records")
+    parser.add_argument("--size", type=int, default=10, help="map size of the game --make records")
+    args = parser.parse_args()
+
+    if args.make is not None:
+        game = record_random(args.path, args.make, seed=args.seed, size=args.size)
+        print(f"Recorded {args.make} ticks to {args.path}: {game.scoreboard()}")
+        return
+
+    replay = Replay(args.path)
+    print(f"{args.path}: {replay.ticks} ticks, {replay.events} records, {len(replay.data)} bytes"
+          + ("" if replay.complete else " (interrupted recording)"))
+
+    if args.seek is not None:
+        started = time.perf_counter()
+        replay.seek(args.seek)
+        print(f"Reached tick {replay.tick} in {time.perf_counter() - started:.3f}s: {replay.game.scoreboard()}")
+
+    if args.realtime:
+        from render import Renderer
+        renderer = Renderer()
+        try:
+            replay.play(lambda: replay.game.level_map.draw(renderer, f"{replay.game.scoreboard()}  tick {replay.tick}"), args.speed)
+        except KeyboardInterrupt:
+            return
+        finally:
+            renderer.close()
+    else:
+        started = time.perf_counter()
+        ticks = replay.ticks - replay.tick
+        replay.run()
+        elapsed = time.perf_counter() - started
+        print(f"Replayed {ticks} ticks in {elapsed:.2f}s, {ticks / max(elapsed, 1e-9):.0f} ticks per second")
+
+    print(replay.game.scoreboard(), "- matches the recording" if replay.matches_recording() else "- DIVERGED from the recording")
+    if not replay.matches_recording():
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
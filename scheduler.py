@@ -0,0 +1,108 @@
+import time
+
+
+class Jitter:
+    """Running stats of how far events landed from where they were scheduled, in seconds"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, error):
+        self.count += 1
+        self.total += error
+        if error > self.max:
+            self.max = error
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def __str__(self):
+        return f"mean {self.mean * 1000:.2f}ms, max {self.max * 1000:.2f}ms over {self.count}"
+
+
+class FixedStepLoop:
+    """Runs update(dt) at a fixed tick rate and render() at its own, possibly lower, rate.
+
+    Time comes from a monotonic clock and is paid out of an accumulator, so the
+    simulation keeps the same speed whatever the machine load. When the loop falls
+    behind it runs every tick that is due and skips render frames instead; only a
+    stall longer than max_lag (e.g. the pause after a game over) is written off.
+    One call runs at most max_steps ticks, so even when every update takes longer
+    than a tick the loop still draws, and the backlog hits max_lag and is dropped.
+    """
+
+    def __init__(self, update, render, tick_rate=30, render_rate=30, max_lag=1.0, max_steps=5, clock=time.monotonic, sleep=time.sleep):
+        self.update = update
+        self.render = render
+        self.tick_dt = 1 / tick_rate
+        self.frame_dt = 1 / render_rate
+        self.max_lag = max_lag
+        self.max_steps = max_steps
+        self.clock = clock
+        self.sleep = sleep
+        self.running = False
+
+        self.ticks = 0
+        self.frames = 0
+        self.skipped_frames = 0
+        self.dropped_ticks = 0
+        self.tick_jitter = Jitter()   # How late each tick ran
+        self.frame_jitter = Jitter()  # How far each frame interval was from frame_dt
+
+        self.next_tick = None
+        self.next_frame = None
+        self.last_frame = None
+
+    def resync(self):
+        """Forgets any backlog, e.g. after the game deliberately paused"""
+        now = self.clock()
+        self.next_tick = now
+        self.next_frame = now
+
+    def stop(self):
+        self.running = False
+
+    def run_once(self):
+        """Runs the ticks and the frame that are due, and returns how long until the next one is"""
+        now = self.clock()
+        if now - self.next_tick > self.max_lag:
+            missed = int((now - self.next_tick) / self.tick_dt)
+            self.dropped_ticks += missed
+            self.next_tick += missed * self.tick_dt
+
+        steps = 0
+        while now >= self.next_tick and steps < self.max_steps:
+            steps += 1
+            self.tick_jitter.add(now - self.next_tick)
+            self.update(self.tick_dt)
+            self.ticks += 1
+            self.next_tick += self.tick_dt
+            now = self.clock()
+
+        if now >= self.next_frame:
+            if self.last_frame is not None:
+                self.frame_jitter.add(abs(now - self.last_frame - self.frame_dt))
+            self.render()
+            self.frames += 1
+            self.last_frame = now
+
+            # Frames that are already late are skipped, not drawn back to back
+            self.next_frame += self.frame_dt
+            if self.next_frame <= now:
+                missed = int((now - self.next_frame) / self.frame_dt) + 1
+                self.skipped_frames += missed
+                self.next_frame += missed * self.frame_dt
+            now = self.clock()
+
+        return min(self.next_tick, self.next_frame) - now
+
+    def run(self):
+        self.running = True
+        self.resync()
+        while self.running:
+            wait = self.run_once()
+            if wait > 0:
+                self.sleep(wait)
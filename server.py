@@ -0,0 +1,419 @@
+import time
+import random
+import struct
+import asyncio
+import logging
+import argparse
+import multiprocessing
+from array import array
+import npgrid
+from game import Game, SIZE, PERCENTAGE
+from events import ROUND_OVER
+from inputs import InputQueue
+from scheduler import Jitter
+
+log = logging.getLogger(__name__)
+
+TICK_RATE = 30  # Ticks per second of every match
+
+# Keys each seat's actions stand for: up, down, left, right, bomb
+ACTION_KEYS = ("wsadf", "ikjlç")
+
+# Every server message is a type byte and a payload length, then the payload.
+# Cell values are the grid's int8 values sent as a byte.
+HEADER = struct.Struct("<cI")
+WELCOME = struct.Struct("<BHI")  # seat, map size, match id
+DELTA = struct.Struct("<III")    # tick, changed cells, moved entities; then the cells and entities
+CELL = struct.Struct("<IB")      # flat index y*size+x, value
+ENTITY = struct.Struct("<HHH")   # entity id (0 player, 1 enemy, then other NPCs), x, y
+ROUND = struct.Struct("<BHH")    # winner (0 player, 1 enemy, 2 draw), player score, enemy score
+WINNERS = {'player': 0, 'enemy': 1, 'draw': 2}
+
+# A client that lets this much output pile up unread is disconnected
+MAX_BUFFERED = 1 << 20
+
+
+def message(kind, payload):
+    return HEADER.pack(kind, len(payload)) + payload
+
+
+def snapshot(grid):
+    """The grid's cells as bytes, y*size+x"""
+    if npgrid.is_array(grid):
+        return grid.tobytes()
+    return b"".join(array('b', row).tobytes() for row in grid)
+
+
+def changed_cells(old, new, width):
+    """Indices of the cells that differ between two snapshots; every cell when old is None"""
+    if old is None:
+        return range(len(new))
+    changed = []
+    for start in range(0, len(new), width):
+        end = start + width
+        if old[start:end] != new[start:end]:
+            changed.extend(i for i in range(start, end) if old[i] != new[i])
+    return changed
+
+
+def encode_delta(tick, cells, changed, entities):
+    """A delta message for the changed cells of snapshot cells and the (id, (x, y)) entities that moved"""
+    parts = [DELTA.pack(tick, len(changed), len(entities))]
+    parts.extend(CELL.pack(index, cells[index]) for index in changed)
+    parts.extend(ENTITY.pack(entity_id, x, y) for entity_id, (x, y) in entities)
+    return message(b"D", b"".join(parts))
+
+
+class Match:
+    """One game on the server, with its own grid, bombs, clients and tick task.
+
+    Clients send one byte per action (an index into ACTION_KEYS); the actions go
+    through the game's InputQueue like key presses. After every tick each client
+    gets the cells and entities that changed since the last tick, plus a round
+    message when a round ended.
+    """
+
+    def __init__(self, match_id, seats, size, percentage, seed, tick_rate):
+        self.id = match_id
+        self.tick_rate = tick_rate
+        self.inputs = InputQueue()
+        self.pending = []  # Round messages from the tick being run
+        self.game = Game(size, percentage, seed=seed, inputs=self.inputs, humans=seats)
+        self.game.events.subscribe(self.on_events)
+        self.writers = [None] * seats
+
+        self.cells = None  # Snapshot the clients have
+        self.positions = {}  # Entity id -> position the clients have
+
+        self.ticks = 0
+        self.bytes_sent = 0
+        self.lateness = Jitter()  # How late each tick ran
+
+    def full(self):
+        return None not in self.writers
+
+    def empty(self):
+        return all(writer is None for writer in self.writers)
+
+    def entities(self):
+        game = self.game
+        return [game.player, game.enemy] + game.npcs[1:]
+
+    def on_events(self, tick, events):
+        game = self.game
+        for kind, _, _, detail in events:
+            if kind == ROUND_OVER:
+                winner, _ = detail
+                self.pending.append(message(b"R", ROUND.pack(WINNERS[winner], game.player_score, game.enemy_score)))
+
+    def full_state(self):
+        """A delta from nothing to the current board, for a client that just joined"""
+        cells = snapshot(self.game.level_map.grid)
+        entities = [(entity_id, entity.pos) for entity_id, entity in enumerate(self.entities())]
+        return encode_delta(self.ticks, cells, changed_cells(None, cells, self.game.size), entities)
+
+    def delta(self):
+        """The delta since the last call, or None when nothing changed"""
+        cells = snapshot(self.game.level_map.grid)
+        changed = changed_cells(self.cells, cells, self.game.size)
+        self.cells = cells
+
+        moved = []
+        for entity_id, entity in enumerate(self.entities()):
+            if self.positions.get(entity_id) != entity.pos:
+                self.positions[entity_id] = entity.pos
+                moved.append((entity_id, entity.pos))
+
+        if not changed and not moved:
+            return None
+        return encode_delta(self.ticks, cells, changed, moved)
+
+    def tick(self):
+        self.game.step(1 / self.tick_rate)
+        self.ticks += 1
+
+        messages, self.pending = self.pending, []
+        delta = self.delta()
+        if delta is not None:
+            messages.append(delta)
+        if messages:
+            self.broadcast(b"".join(messages))
+
+    def broadcast(self, data):
+        for seat, writer in enumerate(self.writers):
+            if writer is None:
+                continue
+            if writer.transport.get_write_buffer_size() > MAX_BUFFERED:
+                writer.close()  # Its reader sees the end of the connection and frees the seat
+                continue
+            writer.write(data)
+            self.bytes_sent += len(data)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        dt = 1 / self.tick_rate
+        next_tick = loop.time()
+        while not self.empty():
+            self.lateness.add(max(loop.time() - next_tick, 0.0))
+            self.tick()
+            next_tick += dt
+            delay = next_tick - loop.time()
+            if delay < -1:
+                next_tick = loop.time()  # Far behind: write the backlog off instead of racing through it
+            await asyncio.sleep(max(delay, 0))
+
+
+class Server:
+    """Hosts any number of independent matches in one asyncio loop.
+
+    Each connecting client takes the next free seat, and a match starts ticking
+    once all of its seats are taken: with seats=1 every client plays its own match
+    against the NPC, with seats=2 clients are paired up.
+    """
+
+    def __init__(self, seats=1, size=SIZE, percentage=PERCENTAGE, tick_rate=TICK_RATE, seed=0):
+        self.seats = seats
+        self.size = size
+        self.percentage = percentage
+        self.tick_rate = tick_rate
+        self.seed = seed
+
+        self.matches = {}
+        self.open_match = None
+        self.next_id = 0
+        self.tasks = set()  # Running match tasks; the event loop only keeps weak references to them
+
+        # Totals of the matches that already ended
+        self.finished_ticks = 0
+        self.finished_bytes = 0
+        self.max_lateness = 0.0
+        self.failed = 0  # Matches that stopped on an exception
+
+    def join(self, writer):
+        match = self.open_match
+        if match is None:
+            match = Match(self.next_id, self.seats, self.size, self.percentage, self.seed + self.next_id, self.tick_rate)
+            self.matches[match.id] = match
+            self.open_match = match
+            self.next_id += 1
+
+        seat = match.writers.index(None)
+        match.writers[seat] = writer
+        if match.full():
+            self.open_match = None
+            task = asyncio.get_running_loop().create_task(self.play(match))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+        return match, seat
+
+    async def play(self, match):
+        try:
+            await match.run()
+        except Exception:
+            # Only this match ends: its clients are disconnected, the others play on
+            log.exception("match %d failed", match.id)
+            self.failed += 1
+            for writer in match.writers:
+                if writer is not None:
+                    writer.close()
+        finally:
+            self.matches.pop(match.id, None)
+            self.finished_ticks += match.ticks
+            self.finished_bytes += match.bytes_sent
+            self.max_lateness = max(self.max_lateness, match.lateness.max)
+
+    async def handle(self, reader, writer):
+        match, seat = self.join(writer)
+        writer.write(message(b"W", WELCOME.pack(seat, self.size, match.id)) + match.full_state())
+        keys = ACTION_KEYS[seat]
+        try:
+            while True:
+                data = await reader.read(1024)
+                if not data:
+                    break
+                for action in data:
+                    if action < len(keys):
+                        match.inputs.push(keys[action])
+        except ConnectionError:
+            pass
+        finally:
+            match.writers[seat] = None
+            if match is self.open_match and match.empty():
+                self.open_match = None
+                self.matches.pop(match.id, None)
+            writer.close()
+
+    def stats(self):
+        matches = list(self.matches.values())
+        return {
+            'ticks': self.finished_ticks + sum(match.ticks for match in matches),
+            'bytes': self.finished_bytes + sum(match.bytes_sent for match in matches),
+            'max_lateness': max([self.max_lateness] + [match.lateness.max for match in matches]),
+            'failed': self.failed,
+        }
+
+    async def start(self, host="127.0.0.1", port=0, unix=None):
+        if unix is not None:
+            return await asyncio.start_unix_server(self.handle, path=unix)
+        return await asyncio.start_server(self.handle, host, port)
+
+
+class ClientBoard:
+    """A client's copy of the board, kept up to date from the server's messages"""
+
+    def __init__(self):
+        self.seat = None
+        self.size = 0
+        self.match_id = None
+        self.cells = bytearray()
+        self.positions = {}
+        self.tick = 0
+        self.scores = (0, 0)
+        self.rounds = 0
+
+    def apply(self, kind, payload):
+        if kind == b"W":
+            self.seat, self.size, self.match_id = WELCOME.unpack(payload)
+            self.cells = bytearray(self.size * self.size)
+        elif kind == b"D":
+            self.tick, cell_count, entity_count = DELTA.unpack_from(payload)
+            if len(payload) != DELTA.size + cell_count * CELL.size + entity_count * ENTITY.size:
+                raise ValueError(f"delta of {len(payload)} bytes doesn't hold {cell_count} cells and {entity_count} entities")
+            offset = DELTA.size
+            for index, value in struct.iter_unpack(CELL.format, payload[offset:offset + cell_count * CELL.size]):
+                self.cells[index] = value
+            offset += cell_count * CELL.size
+            for entity_id, x, y in struct.iter_unpack(ENTITY.format, payload[offset:]):
+                self.positions[entity_id] = (x, y)
+        elif kind == b"R":
+            _, player_score, enemy_score = ROUND.unpack(payload)
+            self.scores = (player_score, enemy_score)
+            self.rounds += 1
+
+    def grid(self):
+        """The board as rows of int8 values, like Map.grid"""
+        values = array('b', bytes(self.cells))
+        return [values[y * self.size:(y + 1) * self.size].tolist() for y in range(self.size)]
+
+
+async def connect(address):
+    if isinstance(address, str):
+        return await asyncio.open_unix_connection(address)
+    return await asyncio.open_connection(*address)
+
+
+async def read_message(reader):
+    kind, length = HEADER.unpack(await reader.readexactly(HEADER.size))
+    return kind, await reader.readexactly(length)
+
+
+async def bench_client(address, seconds, actions_per_second, seed, totals):
+    """A loopback client that plays random actions and keeps its board in sync for seconds"""
+    reader, writer = await connect(address)
+    board = ClientBoard()
+    rng = random.Random(seed)
+
+    async def act():
+        while True:
+            await asyncio.sleep(rng.expovariate(actions_per_second))
+            writer.write(bytes([rng.randrange(len(ACTION_KEYS[0]))]))
+
+    actions = asyncio.get_running_loop().create_task(act())
+    received = 0
+    try:
+        deadline = time.monotonic() + seconds
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                kind, payload = await asyncio.wait_for(read_message(reader), remaining)
+            except asyncio.TimeoutError:
+                break
+            received += HEADER.size + len(payload)
+            board.apply(kind, payload)
+    finally:
+        actions.cancel()
+        writer.close()
+    totals['bytes'] += received
+    totals['rounds'] += board.rounds
+
+
+def serve_for_bench(address, seats, size, percentage, conn):
+    """Child process of bench(): serves until told to stop, then sends back its stats"""
+    async def main():
+        server = Server(seats=seats, size=size, percentage=percentage)
+        if isinstance(address, str):
+            listener = await server.start(unix=address)
+            conn.send(address)
+        else:
+            listener = await server.start(*address)
+            conn.send(listener.sockets[0].getsockname()[:2])
+
+        loop = asyncio.get_running_loop()
+        started, cpu_started = time.monotonic(), time.process_time()
+        await loop.run_in_executor(None, conn.recv)  # Wait for the stop
+        stats = server.stats()
+        stats['wall'] = time.monotonic() - started
+        stats['cpu'] = time.process_time() - cpu_started
+        listener.close()
+        conn.send(stats)
+
+    asyncio.run(main())
+
+
+def bench(matches, seats=1, seconds=5.0, size=SIZE, percentage=PERCENTAGE, actions_per_second=4.0, unix=None):
+    """Runs matches full matches against a server in its own process and reports its load"""
+    conn, child_conn = multiprocessing.Pipe()
+    address = unix if unix is not None else ("127.0.0.1", 0)
+    server = multiprocessing.Process(target=serve_for_bench, args=(address, seats, size, percentage, child_conn))
+    server.start()
+    address = conn.recv()
+
+    totals = {'bytes': 0, 'rounds': 0}
+
+    async def clients():
+        await asyncio.gather(*(bench_client(address, seconds, actions_per_second, i, totals)
+                               for i in range(matches * seats)))
+
+    asyncio.run(clients())
+    conn.send("stop")
+    stats = conn.recv()
+    server.join()
+
+    load = stats['cpu'] / stats['wall']
+    expected = matches * seconds * TICK_RATE
+    print(f"{matches} matches x {seats} seats on {size}x{size}: {stats['ticks']} ticks ({stats['ticks'] / expected:.0%} of {expected:.0f}), "
+          f"max tick lateness {stats['max_lateness'] * 1000:.1f}ms")
+    print(f"    server cpu {load:.0%} of one core -> ~{matches / load:.0f} matches per core; "
+          f"{stats['bytes'] / max(stats['ticks'], 1):.1f} bytes per match tick sent, {totals['bytes']} received by clients, {totals['rounds']} round results")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bomberman match server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7777)
+    parser.add_argument("--unix", help="listen on this unix socket path instead of TCP")
+    parser.add_argument("--seats", type=int, default=1, choices=(1, 2), help="players per match: 1 against the NPC, 2 against each other")
+    parser.add_argument("--size", type=int, default=SIZE)
+    parser.add_argument("--walls", type=int, default=PERCENTAGE)
+    parser.add_argument("--bench", type=int, nargs="*", metavar="MATCHES", help="run loopback clients for these match counts instead of serving")
+    parser.add_argument("--seconds", type=float, default=5.0, help="length of each --bench run")
+    args = parser.parse_args()
+
+    if args.bench is not None:
+        for matches in args.bench or (10, 100, 300):
+            bench(matches, args.seats, args.seconds, args.size, args.walls, unix=args.unix)
+        return
+
+    async def serve():
+        server = Server(seats=args.seats, size=args.size, percentage=args.walls)
+        listener = await server.start(args.host, args.port, args.unix)
+        async with listener:
+            await listener.serve_forever()
+
+    asyncio.run(serve())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from batchenv import ACTIONS, BatchEnv
+from game import Game
+from replay import ReplayInputs
+
+
+def test_steps_match_independent_games():
+    count = 8
+    env = BatchEnv(count, max_ticks=300)
+    games = [Game(10, 70, seed=i, max_ticks=300, backend="numpy", inputs=ReplayInputs()) for i in range(count)]
+    rng = np.random.default_rng(1)
+    rounds = 0
+    for _ in range(1500):
+        actions = np.where(rng.random(count) < 0.2, rng.integers(1, 6, count), 0)
+        grids, _, done = env.step(actions)
+        rounds += done.sum()
+        for i, game in enumerate(games):
+            if actions[i]:
+                game.inputs.pending = [(0, ACTIONS[actions[i]], 0.0)]
+            game.step(1/30)
+            batched = env.games[i]
+            assert np.array_equal(game.level_map.grid, grids[i])
+            assert game.ticks == env.ticks[i]
+            assert (game.player_score, game.enemy_score) == (batched.player_score, batched.enemy_score)
+
+    assert rounds > 0
@@ -0,0 +1,35 @@
+import time
+from game import Game, WALL
+from lookahead import Lookahead
+
+
+def test_deepens_past_depth_1_on_a_large_map():
+    # The NPC and the player start in opposite corners, over 5000 steps apart
+    lookahead = Lookahead(budget_ms=10_000, max_depth=3)
+    game = Game(size=2600, seed=0, search_budget=1000, lookahead=lookahead)
+    lookahead.decide(game.enemy, game.player)
+    assert lookahead.depths == 3
+
+
+def test_decisions_stay_near_the_budget_on_a_large_map():
+    lookahead = Lookahead(budget_ms=5)
+    game = Game(size=1000, seed=0, search_budget=1000, lookahead=lookahead)
+    times = []
+    for _ in range(10):
+        started = time.perf_counter()
+        lookahead.decide(game.enemy, game.player)
+        times.append(time.perf_counter() - started)
+    assert sorted(times)[len(times) // 2] < 0.010
+
+
+def test_table_is_cleared_when_a_wall_changes():
+    lookahead = Lookahead(budget_ms=5, max_depth=2)
+    game = Game(size=10, seed=0, lookahead=lookahead)
+    lookahead.decide(game.enemy, game.player)
+    assert lookahead.table
+    x, y = next((x, y) for y in range(10) for x in range(10) if game.level_map.grid[y][x] == WALL)
+    game.level_map.set(x, y, 0)
+    assert not game.level_map.walls[y * 10 + x]
+    lookahead.table[-1] = 0  # Marks the table from before the change
+    lookahead.decide(game.enemy, game.player)
+    assert -1 not in lookahead.table
@@ -0,0 +1,39 @@
+import random
+import pytest
+import game
+from inputs import InputQueue
+from npgrid import np
+from pathcache import MISSING, grid_hash
+
+PARAMS = [dict(ai_player=True), dict(humans=2), dict(npc_count=4, size=20, percentage=30), dict()]
+if np is not None:
+    PARAMS.append(dict(backend="numpy", ai_player=True))
+
+
+@pytest.mark.parametrize("params", PARAMS)
+def test_cache_hits_and_hash_match_a_fresh_computation(monkeypatch, params):
+    monkeypatch.setattr(game, "ESCAPE_FIELD", False)  # Exercise defend_astar's cache entries too
+    hits = []
+    cached_search = game.Enemy.cached_search
+
+    def checked(self, mode, goal, budget, search):
+        key = (self.game.level_map.hash, self.pos, goal, mode, budget)
+        cached = self.game.path_cache.entries.get(key, MISSING)
+        path = cached_search(self, mode, goal, budget, search)
+        if cached is not MISSING:
+            hits.append(path == search())
+        return path
+
+    monkeypatch.setattr(game.Enemy, "cached_search", checked)
+    rng = random.Random(5)
+    queue = InputQueue()
+    g = game.Game(seed=3, max_ticks=900, inputs=queue, **params)
+    for _ in range(2000):
+        if rng.random() < 0.3:
+            queue.push(rng.choice("wasdfikjlç"))
+        g.step(1/30)
+        assert g.level_map.hash == grid_hash(g.level_map.grid)
+
+    assert all(hits)
+    if g.humans < 2:
+        assert hits  # Only NPCs search
@@ -0,0 +1,46 @@
+import random
+from attack import pursuit_field
+from benchmark import make_maze
+from danger import DangerMap
+from planner import AttackPlanner
+
+
+def bfs_length(maze, danger, npc, target):
+    """Steps of a shortest path over the cells attack_astar may enter, or None"""
+    width = len(maze[0])
+    field = pursuit_field(maze, target, danger, hunters=[npc[1] * width + npc[0]])
+    index = npc[1] * width + npc[0]
+    return field.distance[index] if index in field else None
+
+
+def test_paths_stay_shortest_while_the_target_moves_and_walls_change():
+    size = 30
+    for seed in range(5):
+        rng = random.Random(seed)
+        maze = make_maze(size, 25, seed)
+        danger = DangerMap.from_grid(maze)
+        planner = AttackPlanner(maze, danger)
+        npc, target = (size-1, size-1), (0, 0)
+
+        for _ in range(150):
+            # A wall appears or goes away somewhere other than under the NPC or the target
+            x, y = rng.randrange(size), rng.randrange(size)
+            if (x, y) not in (npc, target):
+                maze[y][x] = 0 if maze[y][x] == 1 else 1
+                planner.cell_changed(y * size + x)
+
+            path = planner.plan(npc, target)
+            expected = bfs_length(maze, danger, npc, target)
+            if expected is None:
+                assert path is None
+            else:
+                assert path is not None and len(path) - 1 == expected
+                assert path[0] == npc and path[-1] == target
+
+            if path and len(path) > 2:
+                npc = path[1]
+            x, y = target
+            moves = [(x + dx, y + dy) for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1))
+                     if 0 <= x + dx < size and 0 <= y + dy < size and maze[y + dy][x + dx] != 1]
+            if moves:
+                target = rng.choice(moves)
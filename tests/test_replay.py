@@ -0,0 +1,28 @@
+import random
+from replay import Replay, record_random
+
+
+def state(game):
+    return ([list(row) for row in game.level_map.grid], game.player.pos, game.enemy.pos,
+            game.player_score, game.enemy_score, len(game.circles), game.ticks)
+
+
+def test_seek_reaches_the_same_state_as_playing_through(tmp_path):
+    path = tmp_path / "game.bmr"
+    recorded = record_random(path, 1500, seed=3, keys_per_second=8.0, size=10)
+
+    replay = Replay(path, snapshot_every=100)
+    expected = {}
+    while not replay.finished():
+        replay.step()
+        if replay.tick % 25 == 0:
+            expected[replay.tick] = state(replay.game)
+    assert state(replay.game) == state(recorded)
+    assert replay.matches_recording()
+
+    # Backwards, forwards and onto snapshots, in any order
+    ticks = random.Random(0).sample(sorted(expected), 20) + [300, 25, 1500]
+    for tick in ticks:
+        replay.seek(tick)
+        assert replay.tick == tick
+        assert state(replay.game) == expected[tick]
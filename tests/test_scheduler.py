@@ -0,0 +1,27 @@
+from scheduler import FixedStepLoop
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_slow_update_still_renders_and_drops_the_backlog():
+    clock = FakeClock()
+    frames = []
+
+    def update(dt):
+        clock.now += 2 * dt  # Every tick takes twice as long as it simulates
+
+    loop = FixedStepLoop(update, lambda: frames.append(clock.now), tick_rate=30, render_rate=30, clock=clock)
+    loop.resync()
+    for _ in range(100):
+        loop.run_once()
+
+    assert len(frames) == 100
+    assert loop.ticks <= 100 * loop.max_steps
+    assert loop.dropped_ticks > 0
+    assert clock.now - loop.next_tick <= loop.max_lag + loop.max_steps * loop.tick_dt
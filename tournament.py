@@ -0,0 +1,104 @@
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+from multiprocessing import Pool
+from game import Game, SIZE, PERCENTAGE
+from lookahead import Lookahead
+
+DT = 1/30  # Simulated seconds per tick, the terminal game's frame rate
+
+
+def play_match(args):
+    """Plays one seeded NPC-vs-NPC round headless and returns its result"""
+    seed, size, percentage, max_ticks, lookahead_ms = args
+    result = {}
+
+    def record(winner, message):
+        result.update(seed=seed, winner=winner, ticks=game.ticks, bombs=game.bombs_placed, planning_time=game.planning_time)
+
+    lookahead = Lookahead(lookahead_ms) if lookahead_ms else None
+    game = Game(size=size, percentage=percentage, seed=seed, ai_player=True, max_ticks=max_ticks, on_game_over=record, lookahead=lookahead)
+    while not result:
+        game.step(DT)
+    return result
+
+
+class Report:
+    """Aggregates match results as they stream in"""
+
+    def __init__(self):
+        self.matches = 0
+        self.wins = {'player': 0, 'enemy': 0, 'draw': 0}
+        self.ticks = 0
+        self.bombs = 0
+        self.planning_time = 0.0
+
+    def add(self, result):
+        self.matches += 1
+        self.wins[result['winner']] += 1
+        self.ticks += result['ticks']
+        self.bombs += result['bombs']
+        self.planning_time += result['planning_time']
+
+    def summary(self, elapsed):
+        matches = max(self.matches, 1)
+        return {
+            'matches': self.matches,
+            'red_wins': self.wins['player'],
+            'blue_wins': self.wins['enemy'],
+            'draws': self.wins['draw'],
+            'mean_ticks': self.ticks / matches,
+            'mean_bombs': self.bombs / matches,
+            'planning_ms_per_match': self.planning_time * 1000 / matches,
+            'planning_us_per_tick': self.planning_time * 1e6 / max(self.ticks, 1),
+            'elapsed': elapsed,
+            'matches_per_second': self.matches / elapsed if elapsed else 0.0,
+            'ticks_per_second': self.ticks / elapsed if elapsed else 0.0,
+        }
+
+
+def run(matches, workers, size=SIZE, percentage=PERCENTAGE, max_ticks=30 * 60, seed=0, results=None, progress=None, lookahead_ms=None):
+    """Plays seeds seed..seed+matches-1 across a process pool and returns the aggregated summary
+
+    Every result is written as a JSON line to results, if given, as soon as it arrives.
+    With lookahead_ms the blue NPC plays with a lookahead search of that budget per step.
+    """
+    report = Report()
+    jobs = [(seed + i, size, percentage, max_ticks, lookahead_ms) for i in range(matches)]
+    chunksize = max(1, matches // (workers * 16))
+
+    started = time.perf_counter()
+    with Pool(workers) as pool:
+        for result in pool.imap_unordered(play_match, jobs, chunksize=chunksize):
+            report.add(result)
+            if results is not None:
+                results.write(json.dumps(result) + "\n")
+            if progress and report.matches % progress == 0:
+                print(f"{report.matches}/{matches} matches", file=sys.stderr)
+    return report.summary(time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plays seeded NPC-vs-NPC matches on every core and reports the results")
+    parser.add_argument("--matches", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--size", type=int, default=SIZE)
+    parser.add_argument("--percentage", type=int, default=PERCENTAGE)
+    parser.add_argument("--max-ticks", type=int, default=30 * 60, help="ticks before a match is called a draw")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first match")
+    parser.add_argument("--results", help="file to stream one JSON line per match to")
+    parser.add_argument("--lookahead", type=float, metavar="MS", help="blue plays with a lookahead search of this many milliseconds per step")
+    args = parser.parse_args()
+
+    with open(args.results, "w") if args.results else contextlib.nullcontext() as results:
+        summary = run(args.matches, args.workers, args.size, args.percentage, args.max_ticks, args.seed,
+                      results=results, progress=max(1, args.matches // 10), lookahead_ms=args.lookahead)
+
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,282 @@
+import time
+import signal
+import argparse
+from array import array
+from itertools import chain
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing.shared_memory import SharedMemory
+from attack import attack_astar
+from buffers import SearchBuffers
+from npgrid import is_array
+
+DEADLINE = 0.002  # Seconds one NPC may wait for its plan per tick
+SLOTS = 4         # Snapshots kept in shared memory; a search outliving SLOTS-1 newer ones is dropped
+
+# Shared memory holds SLOTS snapshots of the board, one after the other. A slot
+# starts with the version of the snapshot in it (0 while it is being written),
+# then the grid cells as int8, y*size+x, then the danger counts as uint16.
+STAMP = 8
+
+
+def slot_layout(size):
+    """Offsets of the cells and the counts in a slot, and the slot's size in bytes"""
+    cells = size * size
+    counts = STAMP + cells + cells % 2  # uint16 counts start on an even offset
+    return STAMP, counts, counts + 2 * cells
+
+
+class SnapshotDanger:
+    """Stands in for the DangerMap in a worker: attack_astar only reads its counts"""
+
+    __slots__ = ('counts',)
+
+    def __init__(self, counts):
+        self.counts = counts
+
+
+def slot_views(buf, size, slot):
+    """Stamp, grid rows and danger counts of a slot, as memoryviews into buf"""
+    cells_at, counts_at, slot_size = slot_layout(size)
+    base = slot * slot_size
+    cells = size * size
+    stamp = buf[base:base + STAMP].cast('Q')
+    flat = buf[base + cells_at:base + cells_at + cells].cast('b')
+    counts = buf[base + counts_at:base + counts_at + 2 * cells].cast('H')
+    return stamp, flat, counts
+
+
+# State of a worker process, set up once by attach()
+worker = None
+
+
+def attach(name, size, slots):
+    """Worker initializer: maps the snapshots into this process, without copying them"""
+    global worker
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl-C is for the game, which shuts the pool down
+    memory = SharedMemory(name=name)
+    views = []
+    for slot in range(slots):
+        stamp, flat, counts = slot_views(memory.buf, size, slot)
+        # Slices of a memoryview share its memory, so the rows index like a list grid
+        rows = [flat[y * size:(y + 1) * size] for y in range(size)]
+        views.append((stamp, rows, SnapshotDanger(counts)))
+    worker = (memory, views, SearchBuffers(size * size))
+
+
+def search(slot, version, start, goal, max_expanded):
+    """Runs attack_astar on a snapshot; None if the snapshot was replaced before or during the search"""
+    _, views, buffers = worker
+    stamp, rows, danger = views[slot]
+    if stamp[0] != version:
+        return None
+    stats = {'expanded': 0}
+    path = attack_astar(rows, start, goal, danger, stats, max_expanded, buffers)
+    if stamp[0] != version:
+        return None
+    return path, stats['expanded']
+
+
+class Job:
+    __slots__ = ('future', 'pos')
+
+    def __init__(self, future, pos):
+        self.future = future
+        self.pos = pos  # Where the NPC stood when the plan was asked for
+
+
+class PlanningPool:
+    """Plans NPC attack paths in worker processes, off the thread running the game.
+
+    The first NPC to ask for a plan in a tick copies the board into a slot of
+    shared memory, which the workers read in place. Each NPC then waits at most
+    deadline seconds per tick for its plan; when it isn't ready the NPC keeps
+    following its last one and picks the new plan up on a later tick. So however
+    long a search takes, it costs the tick no more than the deadline of each NPC.
+    Plans come from a board a few ticks old, so pooled games aren't deterministic.
+    """
+
+    def __init__(self, size, workers=2, deadline=DEADLINE, slots=SLOTS):
+        self.size = size
+        self.deadline = deadline
+        self.slots = slots
+        *_, slot_size = slot_layout(size)
+        self.memory = SharedMemory(create=True, size=slots * slot_size)
+        self.views = [slot_views(self.memory.buf, size, slot) for slot in range(slots)]
+        self.executor = ProcessPoolExecutor(workers, initializer=attach, initargs=(self.memory.name, size, slots))
+
+        self.version = 0        # Version of the latest snapshot
+        self.published = None   # (round, tick) it was taken at
+        self.tick = None        # (round, tick) the waits below belong to
+        self.waited = {}        # NPC -> seconds waited for its plan this tick
+        self.jobs = {}          # NPC -> its Job
+
+        self.submitted = 0
+        self.fresh = 0     # Plans handed to an NPC
+        self.stale = 0     # Searches dropped: snapshot overwritten, or the NPC left the planned path
+        self.late = 0      # Waits that ran out of deadline
+        self.expanded = 0
+
+    def publish(self, game):
+        """Copies the board into the next slot, at most once per tick"""
+        key = (game.rounds, game.ticks)
+        if self.published == key:
+            return
+        self.published = key
+        self.version += 1
+        stamp, flat, counts = self.views[self.version % self.slots]
+        stamp[0] = 0  # Searches that read this slot from now on drop their result
+        grid = game.level_map.grid
+        if is_array(grid):
+            flat[:] = memoryview(grid.tobytes()).cast('b')
+        else:
+            flat[:] = array('b', chain.from_iterable(grid))
+        counts[:] = game.level_map.danger.counts
+        stamp[0] = self.version
+
+    def plan(self, npc, goal):
+        """A path for npc from where it stands to goal, or None while no new plan is ready"""
+        game = npc.game
+        key = (game.rounds, game.ticks)
+        if self.tick != key:
+            self.tick = key
+            self.waited.clear()
+
+        job = self.jobs.get(npc)
+        if job is None:
+            self.publish(game)
+            future = self.executor.submit(search, self.version % self.slots, self.version, npc.pos, goal, game.search_budget)
+            job = self.jobs[npc] = Job(future, npc.pos)
+            self.submitted += 1
+
+        waited = self.waited.get(npc, 0.0)
+        if waited < self.deadline and not job.future.done():
+            started = time.perf_counter()
+            wait([job.future], self.deadline - waited)
+            self.waited[npc] = waited + time.perf_counter() - started
+        if not job.future.done():
+            self.late += 1
+            return None
+
+        del self.jobs[npc]
+        result = job.future.result()
+        if result is None:
+            self.stale += 1
+            return None
+        path, expanded = result
+        self.expanded += expanded
+        game.search_stats['expanded'] = expanded
+        game.profiler.count('planning_pool.nodes', expanded)
+        if npc.pos not in path:
+            # The NPC moved off the planned path while it was searched
+            self.stale += 1
+            return None
+        self.fresh += 1
+        return path[path.index(npc.pos):]
+
+    def forget(self):
+        """Drops the plans asked for so far, e.g. when the board is reset"""
+        for job in self.jobs.values():
+            job.future.cancel()
+        self.jobs.clear()
+        self.waited.clear()
+        self.published = None  # The next plan takes a new snapshot
+
+    def report(self):
+        return (f"{self.submitted} plans asked for, {self.fresh} used, {self.stale} stale, "
+                f"{self.late} waits past the deadline, {self.expanded} cells expanded")
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+        self.views = None  # The views must go before the memory can be closed
+        self.memory.close()
+        self.memory.unlink()
+
+
+def wall_in(game):
+    """Walls the player into its corner, so every search for it exhausts the map
+
+    The NPCs start at the cell closest to the player they can reach, where they
+    search again whenever the board changed.
+    """
+    from game import WALL
+    level_map = game.level_map
+    level_map.set(1, 0, WALL)
+    level_map.set(0, 1, WALL)
+    if game.planning is not None:
+        game.planning.forget()  # The first plan was for the open map
+    for npc in game.npcs:
+        path = attack_astar(level_map.grid, npc.pos, game.player.pos, level_map.danger, {'expanded': 0})
+        level_map.put(*npc.pos, 0)
+        npc.pos = path[-1]
+        level_map.put(*npc.pos, npc.value)
+        npc.next_moves = []
+
+
+def walled_in_game(size, pool=None):
+    from game import Game
+    game = Game(size=size, percentage=10, seed=size, planning=pool)
+    wall_in(game)
+    return game
+
+
+class Churn:
+    """Puts a wall on a different empty cell of the map's far half every tick, as burning walls change a busy map
+
+    The board doesn't repeat for thousands of ticks, so the NPC can't reuse a
+    search (from the path cache, or by knowing it found nothing last time) and
+    searches the whole map again whenever it needs a plan.
+    """
+
+    def __init__(self):
+        self.cell = None  # The wall put last tick
+
+    def __call__(self, game, tick):
+        from game import WALL
+        level_map = game.level_map
+        grid = level_map.grid
+        if self.cell is not None:
+            level_map.set(*self.cell, 0)
+            self.cell = None
+        size = game.size
+        y, x = divmod(tick * 7919 % (size * size), size)
+        if y > size // 2 and grid[y][x] == 0:
+            level_map.set(x, y, WALL)
+            self.cell = (x, y)
+
+
+def tick_times(game, ticks):
+    times = []
+    churn = Churn()
+    for tick in range(ticks):
+        churn(game, tick)
+        started = time.perf_counter()
+        if game.step(1/30) is not None:
+            wall_in(game)  # Again on the new round's board
+            churn = Churn()
+        times.append(time.perf_counter() - started)
+    times.sort()
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tick times with NPC planning in the game loop and in a worker pool")
+    parser.add_argument("--size", type=int, default=100)
+    parser.add_argument("--ticks", type=int, default=3000)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    for label in ("in the loop", f"{args.workers} workers"):
+        pool = PlanningPool(args.size, args.workers) if "workers" in label else None
+        try:
+            times = tick_times(walled_in_game(args.size, pool), args.ticks)
+        finally:
+            if pool is not None:
+                pool.close()
+        print(f"{label:>12}: tick mean {sum(times) / len(times) * 1000:.2f}ms, "
+              f"p99 {times[int(len(times) * 0.99)] * 1000:.2f}ms, max {times[-1] * 1000:.2f}ms")
+        if pool is not None:
+            print(f"{'':>12}  {pool.report()}")
+
+
+if __name__ == '__main__':
+    main()